@@ -6,27 +6,37 @@ import networkx as nx
 from pathlib import Path
 from termcolor import colored
 import itertools
+import os
+import sys
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ingestion.dataset import load_messages
 
 # --- CONFIG ---
 INPUT_FILE = "data/processed/chat_history.parquet"
 OUTPUT_DIR = "data/reports"
 MIN_MESSAGES_FILTER = 50 
 
-def generate_network_graph():
+def generate_network_graph(input_path=INPUT_FILE, chat_ids=None, start=None, end=None):
     print(colored("🕸️  Iniciando Mapeamento de Rede...", "cyan"))
     
-    if not Path(INPUT_FILE).exists():
+    if not Path(input_path).exists():
         print(colored("❌ Arquivo não encontrado.", "red"))
         return
 
-    df = pd.read_parquet(INPUT_FILE)
+    df = load_messages(input_path, chat_ids=chat_ids, start=start, end=end)
     author_counts = df['author'].value_counts()
     valid_authors = author_counts[author_counts > MIN_MESSAGES_FILTER].index
     df = df[df['author'].isin(valid_authors)].copy()
     
     interactions = []
     df['next_author'] = df['author'].shift(-1)
-    transitions = df[df['author'] != df['next_author']].dropna()
+    transitions = df[df['author'] != df['next_author']].dropna(subset=['next_author'])
+    # No corpus multi-chat, a última mensagem de um chat não "responde" ao próximo
+    if 'chat_id' in df.columns:
+        transitions = transitions[transitions['chat_id'] == df['chat_id'].shift(-1)[transitions.index]]
     
     for _, row in transitions.iterrows():
         pair = sorted([row['author'], row['next_author']])
@@ -8,6 +8,14 @@ from transformers.pipelines.pt_utils import KeyDataset
 from tqdm import tqdm
 from termcolor import colored
 import gc
+import argparse
+import os
+import sys
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ingestion.dataset import load_messages
 
 # --- CONFIG ---
 INPUT_FILE = "data/processed/chat_history.parquet"
@@ -28,7 +36,7 @@ def is_valid_message(text):
     if any(term in text_lower for term in SYSTEM_STOPWORDS): return False
     return True
 
-def analyze_sentiment():
+def analyze_sentiment(input_path=INPUT_FILE, chat_ids=None, start=None, end=None):
     print(colored("🚀 Iniciando Análise de Sentimento (MODO TURBO)...", "cyan"))
     
     # Limpeza prévia
@@ -36,12 +44,13 @@ def analyze_sentiment():
         torch.cuda.empty_cache()
     gc.collect()
 
-    if not Path(INPUT_FILE).exists():
+    if not Path(input_path).exists():
         print(colored("❌ Arquivo de dados não encontrado.", "red"))
         return
 
-    # 1. Carregar e Filtrar
-    df = pd.read_parquet(INPUT_FILE)
+    # 1. Carregar e Filtrar (no corpus, só as partições pedidas)
+    df = load_messages(input_path, chat_ids=chat_ids, start=start, end=end,
+                       columns=['content', 'timestamp'])
     df = df[df['content'].apply(is_valid_message)].copy()
     msgs = df['content'].tolist()
     use_gpu = torch.cuda.is_available()
@@ -101,8 +110,7 @@ def analyze_sentiment():
     plt.close()
 
     # B) Timeline
-    df['date'] = pd.to_datetime(df['date'], format='%m/%d/%y', errors='coerce')
-    daily_sentiment = df.groupby('date')['sentiment_val'].mean()
+    daily_sentiment = df.groupby(df['timestamp'].dt.normalize())['sentiment_val'].mean()
     rolling_sentiment = daily_sentiment.rolling(window=7).mean()
 
     plt.figure(figsize=(16, 8))
@@ -124,4 +132,10 @@ def analyze_sentiment():
     print(colored(f"\n✅ Concluído! Gráficos gerados em: {OUTPUT_DIR}", "green"))
 
 if __name__ == "__main__":
-    analyze_sentiment()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=INPUT_FILE)
+    parser.add_argument('--chat', action='append')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    args = parser.parse_args()
+    analyze_sentiment(args.input, chat_ids=args.chat, start=args.start, end=args.end)
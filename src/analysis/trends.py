@@ -6,6 +6,13 @@ import seaborn as sns
 from wordcloud import WordCloud
 from pathlib import Path
 from termcolor import colored
+import os
+import sys
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ingestion.dataset import load_messages
 
 plt.style.use('dark_background')
 sns.set_palette("husl")
@@ -13,19 +20,21 @@ sns.set_palette("husl")
 INPUT_FILE = "data/processed/chat_history.parquet"
 OUTPUT_DIR = "data/reports"
 
-def generate_trends():
+def generate_trends(input_path=INPUT_FILE, chat_ids=None, start=None, end=None):
     print(colored("📊 Iniciando Trends...", "cyan"))
     
-    if not Path(INPUT_FILE).exists(): return
+    if not Path(input_path).exists(): return
 
-    df = pd.read_parquet(INPUT_FILE)
-    df['date'] = pd.to_datetime(df['date'], format='%m/%d/%y', errors='coerce')
+    # `timestamp` já vem tipado da ingestão (formato de data detectado uma vez);
+    # no corpus particionado, chat_ids/start/end leem só as partições pedidas
+    df = load_messages(input_path, chat_ids=chat_ids, start=start, end=end,
+                       columns=['author', 'content', 'timestamp'])
     Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
     # Top Participants
     plt.figure(figsize=(10, 6))
     plt.clf()
-    top = df['author'].value_counts().head(10)
+    top = df['author'].astype(str).value_counts().head(10)
     if not top.empty:
         sns.barplot(x=top.values, y=top.index)
         plt.title('Top Participantes')
@@ -48,7 +57,7 @@ def generate_trends():
     plt.close()
 
     # Timeline (Agrupado por mês para ficar mais limpo)
-    daily = df.groupby(df['date'].dt.to_period('M')).size()
+    daily = df.groupby(df['timestamp'].dt.to_period('M')).size()
     if not daily.empty:
         plt.figure(figsize=(15, 5))
         plt.clf()
@@ -1,5 +1,6 @@
 import click
 import os
+import subprocess
 import sys
 from termcolor import colored
 
@@ -13,39 +14,109 @@ def cli():
 
 @cli.command()
 @click.option('--file', default='data/raw/_chat.txt', help='Caminho do arquivo de chat exportado')
-def ingest(file):
-    """1. Processar arquivo de texto bruto"""
-    from src.ingestion.processor import WhatsAppProcessor
+@click.option('--full', is_flag=True, help='Ignora o checkpoint e reprocessa o arquivo inteiro')
+@click.option('--stream', is_flag=True, help='Com --full: modo streaming (memória limitada) para exports muito grandes')
+@click.option('--batch-size', default=50_000, show_default=True, help='Mensagens por row group no modo streaming')
+@click.option('--workers', default=1, show_default=True, help='Processos para ingestão paralela (0 = todos os núcleos; implica --full)')
+@click.option('--dir', 'input_dir', default=None, help='Diretório com vários exports: gera o corpus particionado por chat_id/mês')
+def ingest(file, full, stream, batch_size, workers, input_dir):
+    """1. Processar arquivo de texto bruto (incremental por padrão)"""
+    from src.ingestion.processor import WhatsAppProcessor, ingest_corpus
+    if stream and workers != 1:
+        raise click.UsageError("--stream e --workers não podem ser combinados.")
+    if input_dir:
+        print(colored(f"🚀 Iniciando ingestão do corpus: {input_dir}", "cyan"))
+        # Um processo por export, usando todos os núcleos salvo --workers > 1
+        ingest_corpus(input_dir, workers=workers if workers > 1 else None)
+        return
     print(colored(f"🚀 Iniciando ingestão de: {file}", "cyan"))
     proc = WhatsAppProcessor()
-    df = proc.parse_file(file)
-    proc.save_processed(df, "data/processed/chat_history.parquet")
+    output = "data/processed/chat_history.parquet"
+    if workers != 1:
+        proc.save_processed(proc.parse_file_parallel(file, workers=workers or None), output)
+    elif not full:
+        proc.ingest_incremental(file, output, batch_size=batch_size)
+    elif stream:
+        proc.save_processed(proc.iter_batches(file, batch_size=batch_size), output)
+    else:
+        proc.save_processed(proc.parse_file(file), output)
+
+def corpus_options(func):
+    """Opções comuns para escolher o dataset e podar partições do corpus."""
+    func = click.option('--end', default=None, help='Data final (AAAA-MM-DD)')(func)
+    func = click.option('--start', default=None, help='Data inicial (AAAA-MM-DD)')(func)
+    func = click.option('--chat', 'chats', multiple=True, help='chat_id do corpus (pode repetir)')(func)
+    func = click.option('--corpus', is_flag=True, help='Usa o corpus particionado em vez do chat_history.parquet')(func)
+    return func
+
+def input_path(corpus):
+    from src.ingestion.dataset import CORPUS_DIR
+    return CORPUS_DIR if corpus else "data/processed/chat_history.parquet"
 
 @cli.command()
-def vector():
+@click.option('--only-new', is_flag=True, help='Lê só as mensagens da última ingestão')
+@click.option('--rebuild', is_flag=True, help='Recria a coleção do zero em vez de fazer upsert')
+@click.option('--batch-size', default=64, show_default=True, help='Mensagens por lote de embedding/upload')
+@click.option('--workers', default=0, help='Processos de encoding sem GPU (0 = um por núcleo)')
+@click.option('--backend', type=click.Choice(['torch', 'onnx', 'onnx-int8']), default=None,
+              help='Encoder de embeddings (padrão: $EMBEDDING_BACKEND ou torch)')
+@click.option('--profile', type=click.Choice(['memory', 'balanced', 'disk']), default=None,
+              help='Layout da coleção; muda o de uma coleção existente sem re-vetorizar')
+@click.option('--mode', type=click.Choice(['messages', 'windows']), default=None,
+              help='Um ponto por mensagem ou por janela de conversa (trocar recria a coleção)')
+@click.option('--store', type=click.Choice(['qdrant', 'numpy']), default=None,
+              help='Onde gravar os vetores (padrão: $VECTOR_BACKEND ou qdrant)')
+@corpus_options
+def vector(only_new, rebuild, batch_size, workers, backend, profile, mode, store, corpus, chats, start, end):
     """2. Criar/Atualizar Banco Vetorial (Embeddings)"""
     from src.embeddings.vector_store import build_vector_store
+    from src.embeddings.encoders import EMBEDDING_BACKEND
+    from src.embeddings.stores import VECTOR_BACKEND
     print(colored("🧠 Gerando Embeddings...", "cyan"))
-    build_vector_store("data/processed/chat_history.parquet")
+    build_vector_store(input_path(corpus), only_new=only_new, chat_ids=chats or None, start=start, end=end,
+                       rebuild=rebuild, batch_size=batch_size, workers=workers or None,
+                       backend=backend or EMBEDDING_BACKEND, profile=profile, mode=mode,
+                       store=store or VECTOR_BACKEND)
+
+@cli.command()
+@click.option('--corpus', is_flag=True, help='Usa o corpus particionado em vez do chat_history.parquet')
+def index(corpus):
+    """Reconstruir o índice de mensagens: BM25 e posições (a ingestão já faz isso)"""
+    from src.ingestion.message_index import build_message_index
+    build_message_index(input_path(corpus))
+
+@cli.command()
+@click.option('--corpus', is_flag=True, help='Usa o corpus particionado em vez do chat_history.parquet')
+@click.option('--model', default=None, help='Modelo do Ollama para os resumos (padrão: o do chat)')
+def summarize(corpus, model):
+    """Gerar/atualizar os resumos por dia, semana e mês (só os períodos que mudaram)"""
+    from src.llm.summaries import SUMMARY_MODEL, build_summaries
+    print(colored("🗓️ Gerando resumos hierárquicos...", "cyan"))
+    build_summaries(input_path(corpus), model=model or SUMMARY_MODEL)
 
 @cli.command()
-def analyze():
+@corpus_options
+def analyze(corpus, chats, start, end):
     """3. Gerar Todos os Relatórios (Sentimento, Rede, Trends)"""
     print(colored("📊 Rodando Suíte de Análise Completa...", "magenta"))
+    path = input_path(corpus)
     
     # Trends
     from src.analysis.trends import generate_trends
-    generate_trends()
+    generate_trends(path, chat_ids=chats or None, start=start, end=end)
     
     # Sentimento
     # Importante: O script de sentimento limpa a memória, então rodamos ele isolado ou com cuidado
     print(colored("\n💔 Iniciando Análise de Sentimento...", "magenta"))
-    os.system("python src/analysis/sentiment.py") # Rodamos via system para garantir gestão de memória limpa
+    args = ["--input", path] + [a for c in chats for a in ("--chat", c)]
+    args += ["--start", start] if start else []
+    args += ["--end", end] if end else []
+    subprocess.run(["python", "src/analysis/sentiment.py", *args]) # Processo separado para garantir gestão de memória limpa
     
     # Rede
     print(colored("\n🕸️  Iniciando Análise de Rede...", "magenta"))
     from src.analysis.network_graph import generate_network_graph
-    generate_network_graph()
+    generate_network_graph(path, chat_ids=chats or None, start=start, end=end)
 
 @cli.command()
 def serve():
@@ -54,11 +125,14 @@ def serve():
     os.system("python src/interface/api.py")
 
 @cli.command()
-def chat():
+@click.option('--retrieval', type=click.Choice(['dense', 'hybrid', 'lexical']), default=None,
+              help='Busca vetorial, híbrida (vetores + BM25) ou só BM25 (padrão: $RETRIEVAL_MODE ou hybrid)')
+@click.option('--filters', is_flag=True, help='Tira autores, chat e período da pergunta e filtra a busca por eles')
+def chat(retrieval, filters):
     """5. Conversar no Terminal (Modo CLI)"""
-    from src.llm.chat_engine import WhatsAppChat
-    app = WhatsAppChat()
-    app.chat_loop()
+    from src.llm.chat_engine import RETRIEVAL_MODE, WhatsAppChat
+    app = WhatsAppChat(retrieval or RETRIEVAL_MODE)
+    app.chat_loop(parse_filters=filters)
 
 if __name__ == '__main__':
     cli()
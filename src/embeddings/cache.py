@@ -0,0 +1,187 @@
+import hashlib
+import json
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+# Configurações
+EMBEDDING_CACHE_DIR = "./data/embedding_cache"
+MAX_ITEMS = 500_000
+# Fração da capacidade liberada de uma vez quando o cache enche
+EVICT_FRACTION = 0.10
+
+def text_key(text):
+    """Hash de 64 bits do texto (0 é reservado para slot vazio)."""
+    key = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+    return key or 1
+
+class EmbeddingCache:
+    """Cache de embeddings em disco, endereçado pelo conteúdo do texto.
+
+    Um diretório por modelo com três arrays memory-mapped: `vectors.npy`
+    (float16, capacidade x dimensão), `keys.npy` (hash do texto por slot) e
+    `ticks.npy` (último acesso, para despejar os menos usados quando o
+    cache atinge `max_items`). O índice hash -> slot é reconstruído em
+    memória ao abrir.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR, max_items=MAX_ITEMS):
+        slug = re.sub(r'[^\w.-]+', '_', model_name)
+        self.dir = Path(cache_dir) / slug
+        self.model_name = model_name
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.vectors = None
+        self.keys = None
+        self.ticks = None
+        self.index = {}
+        self.tick = 0
+        self.version = -1
+        if (self.dir / "meta.json").exists():
+            self._open()
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1] if self.vectors is not None else None
+
+    def _open(self):
+        meta = json.loads((self.dir / "meta.json").read_text())
+        self.vectors = np.load(self.dir / "vectors.npy", mmap_mode='r+')
+        self.keys = np.load(self.dir / "keys.npy", mmap_mode='r+')
+        self.ticks = np.load(self.dir / "ticks.npy", mmap_mode='r+')
+        self.tick = meta['tick']
+        self._reindex(meta['version'])
+
+    def _create(self, dim):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        open_memmap = np.lib.format.open_memmap
+        self.vectors = open_memmap(self.dir / "vectors.npy", mode='w+', dtype=np.float16, shape=(self.max_items, dim))
+        self.keys = open_memmap(self.dir / "keys.npy", mode='w+', dtype=np.uint64, shape=(self.max_items,))
+        self.ticks = open_memmap(self.dir / "ticks.npy", mode='w+', dtype=np.int64, shape=(self.max_items,))
+        self.version = 0
+        self._write_meta()
+
+    def _reindex(self, version):
+        slots = np.flatnonzero(self.keys)
+        self.index = dict(zip(self.keys[slots].tolist(), slots.tolist()))
+        self.version = version
+
+    def _write_meta(self):
+        meta = {
+            'model': self.model_name, 'dim': self.dim, 'capacity': len(self.keys),
+            'size': len(self.index), 'tick': self.tick, 'version': self.version,
+        }
+        (self.dir / "meta.json").write_text(json.dumps(meta))
+
+    @contextmanager
+    def _locked(self):
+        """Lock exclusivo entre processos (vetorização e API podem escrever juntos)."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / "lock", 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if (self.dir / "meta.json").exists():
+                    if self.vectors is None:
+                        self._open()
+                    else:
+                        # Outro processo pode ter gravado/despejado desde a última leitura
+                        meta = json.loads((self.dir / "meta.json").read_text())
+                        if meta['version'] != self.version:
+                            self.tick = max(self.tick, meta['tick'])
+                            self._reindex(meta['version'])
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _lookup(self, key):
+        slot = self.index.get(key)
+        # O slot pode ter sido reaproveitado por outro processo
+        if slot is None or self.keys[slot] != key:
+            return None
+        vector = np.array(self.vectors[slot], dtype=np.float32)
+        if self.keys[slot] != key:
+            return None
+        return slot, vector
+
+    def _free_slots(self, n):
+        free = np.flatnonzero(self.keys == 0)
+        if len(free) >= n:
+            return free[:n]
+        # Despeja os menos usados recentemente (em bloco, para amortizar)
+        n_evict = min(len(self.keys), max(n - len(free), int(len(self.keys) * EVICT_FRACTION)))
+        occupied = np.flatnonzero(self.keys)
+        victims = occupied[np.argpartition(self.ticks[occupied], n_evict - 1)[:n_evict]]
+        for key in self.keys[victims].tolist():
+            self.index.pop(key, None)
+        self.keys[victims] = 0
+        return np.concatenate([free, victims])[:n]
+
+    def _store(self, keys, vectors):
+        with self._locked():
+            if self.vectors is None:
+                self._create(vectors.shape[1])
+            # O índice pode ter sido recarregado com gravações de outro processo:
+            # cada chave fica com o vetor da posição original
+            pairs = [(k, vectors[i]) for i, k in enumerate(keys) if k not in self.index]
+            if not pairs:
+                return
+            slots = self._free_slots(len(pairs))
+            for (key, vector), slot in zip(pairs, slots.tolist()):
+                self.vectors[slot] = vector
+                self.keys[slot] = key
+                self.ticks[slot] = self.tick
+                self.index[key] = slot
+            self.version += 1
+            self._write_meta()
+
+    def missing(self, texts):
+        """Quantos de `texts` ainda não estão no cache."""
+        return sum(text_key(t) not in self.index for t in texts)
+
+    def encode(self, texts, encode_fn):
+        """Embeddings (float32) de `texts`, chamando `encode_fn` só para os textos novos.
+
+        Todos os vetores passam por float16, então o resultado é o mesmo com
+        ou sem cache.
+        """
+        self.tick += 1
+        keys = [text_key(t) for t in texts]
+        out = [None] * len(texts)
+        missing = {}
+        for i, key in enumerate(keys):
+            found = self._lookup(key) if self.vectors is not None else None
+            if found is None:
+                missing.setdefault(key, []).append(i)
+                continue
+            slot, out[i] = found
+            self.ticks[slot] = self.tick
+        self.hits += len(texts) - sum(len(v) for v in missing.values())
+        self.misses += sum(len(v) for v in missing.values())
+
+        if missing:
+            new_keys = list(missing)
+            new_texts = [texts[missing[k][0]] for k in new_keys]
+            new_vectors = np.asarray(encode_fn(new_texts), dtype=np.float32).astype(np.float16)
+            for key, vector in zip(new_keys, new_vectors.astype(np.float32)):
+                for i in missing[key]:
+                    out[i] = vector
+            self._store(new_keys, new_vectors)
+
+        if not out:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack(out)
+
+    def flush(self):
+        for arr in (self.vectors, self.keys, self.ticks):
+            if arr is not None:
+                arr.flush()
@@ -0,0 +1,172 @@
+import json
+import os
+from pathlib import Path
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+# Configurações
+VECTOR_DB_PATH = "./data/qdrant_db"
+# Qdrant servidor (ex.: http://localhost:6333); sem ele, usa o modo local em VECTOR_DB_PATH.
+# O modo local faz busca exata: HNSW, quantização e índices de payload só valem no servidor.
+QDRANT_URL = os.environ.get("QDRANT_URL")
+# Perfil e modo de indexação de cada coleção
+COLLECTIONS_PATH = Path(VECTOR_DB_PATH) / "collections.json"
+SCROLL_PAGE = 1_000
+
+# Layout da coleção por perfil
+COLLECTION_PROFILES = {
+    # Vetores e grafo em RAM, sem quantização: menor latência
+    "memory": {"on_disk": False, "quantization": None, "m": 16, "ef_construct": 100, "hnsw_ef": 128, "hnsw_on_disk": False},
+    # Vetores originais em disco, cópia int8 em RAM (4x menor) com rescoring
+    "balanced": {"on_disk": True, "quantization": "scalar", "m": 16, "ef_construct": 100, "hnsw_ef": 128, "hnsw_on_disk": False},
+    # Vetores e grafo em disco, product quantization (16x menor) em RAM
+    "disk": {"on_disk": True, "quantization": "product", "m": 8, "ef_construct": 64, "hnsw_ef": 64, "hnsw_on_disk": True},
+}
+DEFAULT_PROFILE = "memory"
+# "messages": um ponto por mensagem; "windows": um ponto por janela de conversa (windows.py)
+INDEX_MODES = ["messages", "windows"]
+DEFAULT_MODE = "messages"
+# Quantos candidatos a mais a busca quantizada pega antes do rescoring com os vetores originais
+OVERSAMPLING = 2.0
+
+# Índices de payload criados junto com a coleção
+PAYLOAD_INDEXES = {
+    "author": models.PayloadSchemaType.KEYWORD,
+    "chat_id": models.PayloadSchemaType.KEYWORD,
+    "timestamp": models.PayloadSchemaType.DATETIME,
+}
+
+def get_client():
+    if QDRANT_URL:
+        return QdrantClient(url=QDRANT_URL)
+    return QdrantClient(path=VECTOR_DB_PATH)
+
+def collection_info(collection_name):
+    """Perfil e modo com que a coleção foi criada (padrões se não houver registro)."""
+    registry = json.loads(COLLECTIONS_PATH.read_text()) if COLLECTIONS_PATH.exists() else {}
+    return {'profile': DEFAULT_PROFILE, 'mode': DEFAULT_MODE, **registry.get(collection_name, {})}
+
+def save_collection_info(collection_name, **fields):
+    registry = json.loads(COLLECTIONS_PATH.read_text()) if COLLECTIONS_PATH.exists() else {}
+    registry[collection_name] = {**registry.get(collection_name, {}), **fields}
+    COLLECTIONS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    COLLECTIONS_PATH.write_text(json.dumps(registry, indent=2))
+
+def load_profile(collection_name):
+    return collection_info(collection_name)['profile']
+
+def _quantization(kind):
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "product":
+        return models.ProductQuantization(
+            product=models.ProductQuantizationConfig(compression=models.CompressionRatio.X16, always_ram=True)
+        )
+    return None
+
+def create_collection(client, collection_name, dim, profile=DEFAULT_PROFILE, mode=DEFAULT_MODE):
+    """Cria a coleção com o layout do perfil e os índices de payload."""
+    if profile not in COLLECTION_PROFILES:
+        raise ValueError(f"Perfil de coleção desconhecido: {profile} (use {list(COLLECTION_PROFILES)})")
+    cfg = COLLECTION_PROFILES[profile]
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=cfg["on_disk"]),
+        hnsw_config=models.HnswConfigDiff(m=cfg["m"], ef_construct=cfg["ef_construct"], on_disk=cfg["hnsw_on_disk"]),
+        quantization_config=_quantization(cfg["quantization"]),
+    )
+    if QDRANT_URL:
+        for field, schema in PAYLOAD_INDEXES.items():
+            client.create_payload_index(collection_name, field_name=field, field_schema=schema)
+    save_collection_info(collection_name, profile=profile, mode=mode)
+
+def search_params(collection_name):
+    """SearchParams do perfil da coleção (None no modo local, onde não têm efeito)."""
+    if QDRANT_URL is None:
+        return None
+    cfg = COLLECTION_PROFILES[load_profile(collection_name)]
+    quantization = None
+    if cfg["quantization"]:
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=OVERSAMPLING)
+    return models.SearchParams(hnsw_ef=cfg["hnsw_ef"], quantization=quantization)
+
+def payload_filter(filters):
+    """Filtro do Qdrant para `search_filters` (autor, chat e período), servido pelos PAYLOAD_INDEXES."""
+    if not filters:
+        return None
+    must = []
+    for field, key in (('authors', 'author'), ('chat_ids', 'chat_id')):
+        if field in filters:
+            must.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(filters[field]))))
+    if 'start' in filters or 'end' in filters:
+        must.append(models.FieldCondition(
+            key='timestamp', range=models.DatetimeRange(gte=filters.get('start'), lt=filters.get('end')),
+        ))
+    return models.Filter(must=must)
+
+def _copy_points(client, source, target):
+    """Copia pontos (vetores + payload) entre coleções, página a página."""
+    offset = None
+    copied = 0
+    while True:
+        points, offset = client.scroll(
+            collection_name=source,
+            limit=SCROLL_PAGE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            client.upload_points(
+                collection_name=target,
+                points=[models.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+            )
+            copied += len(points)
+        if offset is None:
+            return copied
+
+def recover_reprofile(client, collection_name):
+    """Termina uma migração de perfil antiga (cópia via `__reprofile`) que foi interrompida.
+
+    A coleção temporária pode ser a única cópia dos pontos: ela só é
+    apagada depois que a coleção principal tem pelo menos os mesmos pontos.
+    """
+    scratch = f"{collection_name}__reprofile"
+    if not client.collection_exists(scratch):
+        return
+    if not client.collection_exists(collection_name):
+        dim = client.get_collection(scratch).config.params.vectors.size
+        info = collection_info(collection_name)
+        create_collection(client, collection_name, dim, info['profile'], info['mode'])
+    expected = client.count(scratch, exact=True).count
+    if client.count(collection_name, exact=True).count < expected:
+        print(f"♻️ Recuperando {expected} pontos de '{scratch}' (migração de perfil interrompida)...")
+        _copy_points(client, scratch, collection_name)
+    if client.count(collection_name, exact=True).count >= expected:
+        client.delete_collection(scratch)
+
+def apply_profile(client, collection_name, profile):
+    """Muda o perfil da coleção no lugar (update_collection), sem copiar nem re-vetorizar.
+
+    O Qdrant reconstrói HNSW, quantização e armazenamento em segundo plano,
+    e a coleção segue respondendo durante a troca. No modo local o layout
+    não tem efeito: só o registro muda.
+    """
+    if profile not in COLLECTION_PROFILES:
+        raise ValueError(f"Perfil de coleção desconhecido: {profile} (use {list(COLLECTION_PROFILES)})")
+    recover_reprofile(client, collection_name)
+    print(f"🔁 Aplicando perfil '{profile}' em '{collection_name}' (sem re-vetorizar)...")
+    if QDRANT_URL:
+        cfg = COLLECTION_PROFILES[profile]
+        client.update_collection(
+            collection_name=collection_name,
+            # "" é o vetor padrão (sem nome) da coleção
+            vectors_config={"": models.VectorParamsDiff(on_disk=cfg["on_disk"])},
+            hnsw_config=models.HnswConfigDiff(m=cfg["m"], ef_construct=cfg["ef_construct"], on_disk=cfg["hnsw_on_disk"]),
+            quantization_config=_quantization(cfg["quantization"]) or models.Disabled.DISABLED,
+        )
+    save_collection_info(collection_name, profile=profile)
+    print(f"✅ Perfil '{profile}' aplicado; o Qdrant reindexa em segundo plano.")
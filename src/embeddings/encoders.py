@@ -0,0 +1,202 @@
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# torch/sentence_transformers só são importados pelo backend "torch" (e pela
+# exportação ONNX): quem usa o backend ONNX não carrega o torch.
+
+# Configurações
+# "torch" (SentenceTransformer), "onnx" (fp32) ou "onnx-int8" (quantização dinâmica)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+ONNX_DIR = "./data/models/onnx"
+# Limite de tokens do paraphrase-multilingual-MiniLM-L12-v2
+MAX_SEQ_LENGTH = 128
+# Threads do torch por processo: com modelos do tamanho do MiniLM, vários
+# processos de 1 thread escalam melhor que um processo com N threads
+THREADS_PER_WORKER = 1
+
+# Modelo do processo atual. Com fork, é carregado uma vez no pai e os workers
+# herdam os pesos copy-on-write (sem N cópias na RAM).
+_model = None
+
+def onnx_dir(model_name):
+    return Path(ONNX_DIR) / re.sub(r'[^\w.-]+', '_', model_name)
+
+def export_onnx(model_name, out_dir=None):
+    """Exporta o transformer para ONNX (fp32) e gera a versão int8 dinâmica.
+
+    Grava `model.onnx`, `model_int8.onnx` e o `tokenizer.json`. É o único
+    passo do backend ONNX que precisa de torch.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out_dir = Path(out_dir or onnx_dir(model_name))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"📦 Exportando '{model_name}' para ONNX em {out_dir}...")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["exemplo de mensagem"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            out_dir / "model.onnx",
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=14,
+        )
+    quantize_dynamic(out_dir / "model.onnx", out_dir / "model_int8.onnx", weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    return out_dir
+
+class OnnxEncoder:
+    """Encoder via ONNX Runtime, com mean pooling igual ao do SentenceTransformer.
+
+    Usa só `onnxruntime` e `tokenizers`; exporta o modelo na primeira vez se
+    ainda não houver um em ONNX_DIR.
+    """
+
+    def __init__(self, model_name, quantized=False, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = onnx_dir(model_name)
+        model_file = model_dir / ("model_int8.onnx" if quantized else "model.onnx")
+        if not model_file.exists():
+            export_onnx(model_name, model_dir)
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self.dim = None
+
+    def get_sentence_embedding_dimension(self):
+        if self.dim is None:
+            self.dim = self.encode([""]).shape[1]
+        return self.dim
+
+    def encode(self, texts, show_progress_bar=False, batch_size=32):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = []
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i:i + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, {"input_ids": input_ids, "attention_mask": mask})[0]
+            weights = mask[..., None].astype(np.float32)
+            out.append((hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None))
+        embeddings = np.concatenate(out) if out else np.zeros((0, self.dim or 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+def cache_name(model_name, backend=EMBEDDING_BACKEND):
+    """Nome do modelo no EmbeddingCache: vetores int8/ONNX não se misturam com os do torch."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def default_device(backend=EMBEDDING_BACKEND):
+    if backend != "torch":
+        return "cpu"
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def load_encoder(model_name, backend=EMBEDDING_BACKEND, device=None, threads=None):
+    """Encoder com a interface do SentenceTransformer para o backend escolhido."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embedding desconhecido: {backend} (use {BACKENDS})")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, device=device or default_device(backend))
+    return OnnxEncoder(model_name, quantized=backend == "onnx-int8", threads=threads)
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def default_workers(threads_per_worker=THREADS_PER_WORKER):
+    return max(1, len(available_cores()) // threads_per_worker)
+
+def _init_worker(model_name, backend, core_sets, threads):
+    """Initializer do pool: fixa o worker nos seus núcleos e limita as threads."""
+    global _model
+    cores = core_sets.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    if _model is None:  # spawn (Windows/macOS) ou ONNX: cada worker carrega o seu
+        _model = load_encoder(model_name, backend, device="cpu", threads=threads)
+    elif backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+
+def _encode_shard(texts):
+    return _model.encode(texts, show_progress_bar=False, batch_size=len(texts))
+
+def _dimension():
+    return _model.get_sentence_embedding_dimension()
+
+class CPUEncoderPool:
+    """N processos de encoding em CPU, cada um preso a `threads_per_worker` núcleos.
+
+    Tem a mesma interface usada do SentenceTransformer (`encode`,
+    `get_sentence_embedding_dimension`); cada chamada de `encode` divide os
+    textos entre os workers e junta os resultados na ordem original. Chamadas
+    com `workers` x o lote de um encoder sozinho mantêm cada fatia grande o
+    bastante para o custo de IPC não dominar (ver tests/bench_encoders.py --pool).
+    """
+
+    def __init__(self, model_name, workers=None, threads_per_worker=THREADS_PER_WORKER, backend=EMBEDDING_BACKEND):
+        global _model
+        cores = available_cores()
+        self.workers = workers or default_workers(threads_per_worker)
+
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        # Sessões do ONNX Runtime não sobrevivem bem a fork: só o torch é pré-carregado
+        if ctx.get_start_method() == 'fork' and backend == "torch" and _model is None:
+            _model = load_encoder(model_name, backend, device="cpu")
+
+        # Fatias de núcleos distintas por worker (dá a volta se pedirem mais que o disponível)
+        core_sets = ctx.Queue()
+        for i in range(self.workers):
+            start = i * threads_per_worker
+            core_sets.put({cores[(start + j) % len(cores)] for j in range(threads_per_worker)})
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model_name, backend, core_sets, threads_per_worker),
+        )
+        self.dim = self.pool.submit(_dimension).result()
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, show_progress_bar=False):
+        shard = -(-len(texts) // self.workers)
+        shards = [texts[i:i + shard] for i in range(0, len(texts), shard)]
+        return np.concatenate(list(self.pool.map(_encode_shard, shards)))
+
+    def close(self):
+        self.pool.shutdown()
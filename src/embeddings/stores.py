@@ -0,0 +1,386 @@
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from qdrant_client.http import models
+
+from src.embeddings.collection import (
+    DEFAULT_MODE, DEFAULT_PROFILE, apply_profile, collection_info, create_collection, get_client,
+    payload_filter, recover_reprofile, save_collection_info, search_params,
+)
+from src.ingestion.dataset import filter_mask
+
+# Configurações
+# "qdrant" (local ou servidor, ver collection.py) ou "numpy" (índice exato memory-mapped)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "qdrant")
+VECTOR_BACKENDS = ["qdrant", "numpy"]
+NUMPY_INDEX_DIR = "./data/vector_index"
+SCROLL_PAGE = 10_000
+# Pontos por envio ao Qdrant (o pipeline junta vários lotes do encoder)
+UPLOAD_BATCH = 1_024
+# Linhas convertidas para float32 por vez na busca exata (limita a memória temporária)
+SEARCH_BLOCK_ROWS = 65_536
+# Máscaras de filtro guardadas por versão do índice numpy
+MASK_CACHE_SIZE = 64
+
+# Resultado de busca com os mesmos atributos usados do ScoredPoint do Qdrant
+Hit = namedtuple("Hit", ["id", "score", "payload", "vector"], defaults=[None])
+
+class QdrantStore:
+    """Coleção do Qdrant atrás da interface comum de vector store."""
+
+    def __init__(self, collection_name, client=None):
+        self.name = collection_name
+        self.client = client or get_client()
+        # Uma troca de perfil interrompida pode ter deixado os pontos só na coleção temporária
+        recover_reprofile(self.client, collection_name)
+        self.search_params = search_params(collection_name)
+        self.pending = []
+        self.pending_rows = 0
+        self.dirty = False
+
+    def exists(self):
+        return self.client.collection_exists(self.name)
+
+    def info(self):
+        return collection_info(self.name)
+
+    def current_version(self):
+        """Muda a cada create/commit com alterações (caches de consulta comparam com ela)."""
+        return collection_info(self.name).get('version')
+
+    def _bump_version(self):
+        # No registro de coleções, visível para outros processos (API, dashboard)
+        save_collection_info(self.name, version=time.time_ns())
+
+    def drop(self):
+        self.client.delete_collection(self.name)
+
+    def create(self, dim, profile=DEFAULT_PROFILE, mode=DEFAULT_MODE):
+        create_collection(self.client, self.name, dim, profile, mode)
+        self._bump_version()
+
+    def set_profile(self, profile):
+        apply_profile(self.client, self.name, profile)
+        self.search_params = search_params(self.name)
+        self._bump_version()
+
+    def ids(self):
+        """Todos os IDs já presentes na coleção (sem payload nem vetores)."""
+        ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.name,
+                limit=SCROLL_PAGE,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.update(str(p.id) for p in points)
+            if offset is None:
+                return ids
+
+    def msg_ids(self):
+        """{ID: `msg_id` do payload} de todos os pontos (None em janelas e dados antigos)."""
+        positions = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.name,
+                limit=SCROLL_PAGE,
+                offset=offset,
+                with_payload=['msg_id'],
+                with_vectors=False,
+            )
+            positions.update((str(p.id), (p.payload or {}).get('msg_id')) for p in points)
+            if offset is None:
+                return positions
+
+    def delete(self, ids):
+        self.client.delete(collection_name=self.name, points_selector=models.PointIdsList(points=list(ids)))
+        self.dirty = True
+
+    def update_msg_ids(self, positions):
+        """Regrava o `msg_id` do payload de pontos já indexados ({ID: msg_id novo})."""
+        operations = [
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload={'msg_id': msg_id}, points=[point_id]))
+            for point_id, msg_id in positions.items()
+        ]
+        for i in range(0, len(operations), UPLOAD_BATCH):
+            self.client.batch_update_points(collection_name=self.name, update_operations=operations[i:i + UPLOAD_BATCH])
+        self.dirty = True
+
+    def upload(self, ids, vectors, payload):
+        """Recebe colunas (IDs, matriz numpy, tabela Arrow) e envia em blocos de UPLOAD_BATCH."""
+        self.pending.append((ids, vectors, payload))
+        self.pending_rows += len(ids)
+        self.dirty = True
+        if self.pending_rows >= UPLOAD_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        # Sem PointStruct: a matriz vai inteira e os dicts de payload só existem aqui
+        self.client.upload_collection(
+            collection_name=self.name,
+            ids=[i for ids, _, _ in self.pending for i in ids],
+            vectors=np.concatenate([vectors for _, vectors, _ in self.pending]),
+            payload=pa.concat_tables([payload for _, _, payload in self.pending]).to_pylist(),
+            batch_size=UPLOAD_BATCH,
+        )
+        self.pending, self.pending_rows = [], 0
+
+    def commit(self):
+        self._flush()
+        if self.dirty:
+            self._bump_version()
+            self.dirty = False
+
+    def search(self, vector, limit, filters=None, with_vectors=False):
+        """Top-`limit`; os filtros rodam dentro do Qdrant (índices de payload), sem pós-filtragem."""
+        return self.client.query_points(
+            collection_name=self.name,
+            query=list(map(float, vector)),
+            query_filter=payload_filter(filters),
+            limit=limit,
+            with_vectors=with_vectors,
+            search_params=self.search_params,
+        ).points
+
+    def location(self):
+        return self.client.init_options.get("url") or self.client.init_options.get("path")
+
+    def close(self):
+        # O modo local segura um lock na pasta até o client ser fechado
+        self.client.close()
+
+class NumpyStore:
+    """Índice exato: matriz float16 normalizada em `vectors.npy` + payloads em Parquet.
+
+    Leitores abrem a matriz com memory-map (sem lock, quantos processos
+    quiserem); a busca é um produto matriz x perguntas por blocos seguido de
+    `argpartition`. O escritor acumula as mudanças e as grava em `commit()`
+    trocando os arquivos atomicamente, então leitores nunca veem um índice
+    pela metade e recarregam quando `meta.json` muda.
+    """
+
+    def __init__(self, collection_name, base_dir=NUMPY_INDEX_DIR):
+        self.name = collection_name
+        self.dir = Path(base_dir) / collection_name
+        self.version = None
+        self.vectors = None
+        self.payloads = None
+        self.pending = []
+        self.deleted = set()
+        self.moved = {}
+        self.dim = None
+        self.masks = {}
+
+    def _meta_path(self):
+        return self.dir / "meta.json"
+
+    def _meta(self):
+        return json.loads(self._meta_path().read_text())
+
+    def _files(self, version):
+        return self.dir / f"vectors.{version}.npy", self.dir / f"payload.{version}.parquet"
+
+    def _refresh(self):
+        """(Re)abre a matriz e os payloads se outro processo gravou uma versão nova."""
+        for _ in range(3):
+            meta = self._meta()
+            if meta['version'] == self.version:
+                return
+            vectors_path, payload_path = self._files(meta['version'])
+            try:
+                # Matriz vazia não pode ser mapeada
+                self.vectors = np.load(vectors_path, mmap_mode='r') if meta['count'] else None
+                self.payloads = pq.read_table(payload_path, memory_map=True)
+            except FileNotFoundError:
+                continue  # um commit trocou a versão entre ler o meta e abrir os arquivos
+            self.dim = meta['dim']
+            self.masks = {}
+            self.version = meta['version']
+            return
+        raise RuntimeError(f"Índice em {self.dir} mudou durante a leitura; tente de novo.")
+
+    def _write_meta(self, meta):
+        tmp_meta = self.dir / "meta.json.tmp"
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_meta, self._meta_path())
+
+    def exists(self):
+        return self._meta_path().exists()
+
+    def info(self):
+        meta = self._meta() if self.exists() else {}
+        return {'profile': DEFAULT_PROFILE, 'mode': meta.get('mode', DEFAULT_MODE)}
+
+    def current_version(self):
+        return self._meta()['version'] if self.exists() else None
+
+    def drop(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.version = self.vectors = self.payloads = None
+
+    def create(self, dim, profile=DEFAULT_PROFILE, mode=DEFAULT_MODE):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        # Versão inicial única: um leitor aberto antes de um drop() não confunde a coleção nova com a antiga
+        version = time.time_ns()
+        vectors_path, payload_path = self._files(version)
+        np.save(vectors_path, np.zeros((0, dim), dtype=np.float16))
+        pq.write_table(pa.table({'point_id': pa.array([], pa.string())}), payload_path)
+        self._write_meta({'dim': dim, 'mode': mode, 'count': 0, 'version': version})
+
+    def set_profile(self, profile):
+        print(f"ℹ️ Perfis de coleção são do Qdrant; o índice numpy ignora '{profile}'.")
+
+    def ids(self):
+        self._refresh()
+        return set(self.payloads.column('point_id').to_pylist())
+
+    def msg_ids(self):
+        self._refresh()
+        ids = self.payloads.column('point_id').to_pylist()
+        if 'msg_id' not in self.payloads.column_names:
+            return dict.fromkeys(ids)
+        return dict(zip(ids, self.payloads.column('msg_id').to_pylist()))
+
+    def delete(self, ids):
+        self.deleted.update(ids)
+
+    def update_msg_ids(self, positions):
+        self.moved.update(positions)
+
+    def upload(self, ids, vectors, payload):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        payload = payload.add_column(0, 'point_id', pa.array(ids, pa.string()))
+        self.pending.append(((vectors / np.clip(norms, 1e-12, None)).astype(np.float16), payload))
+
+    def commit(self):
+        """Grava uma versão nova (vetores + payloads) e só então aponta o meta.json para ela.
+
+        Arquivos de versões antigas são apagados; leitores que já os mapearam
+        continuam lendo até recarregar.
+        """
+        if not self.pending and not self.deleted and not self.moved:
+            return
+        self._refresh()
+        old_vectors = self.vectors if self.vectors is not None else np.zeros((0, self.dim), dtype=np.float16)
+        old_payloads = self.payloads
+        if self.deleted:
+            keep = ~np.isin(np.array(old_payloads.column('point_id').to_pylist(), dtype=object), list(self.deleted))
+            old_vectors = old_vectors[keep]
+            old_payloads = old_payloads.filter(pa.array(keep))
+        if self.moved and 'msg_id' in old_payloads.column_names:
+            column = old_payloads.schema.get_field_index('msg_id')
+            msg_ids = [
+                self.moved.get(point_id, msg_id)
+                for point_id, msg_id in zip(old_payloads.column('point_id').to_pylist(), old_payloads.column('msg_id').to_pylist())
+            ]
+            old_payloads = old_payloads.set_column(column, 'msg_id', pa.array(msg_ids, old_payloads.schema.field(column).type))
+
+        new_vectors = [vectors for vectors, _ in self.pending]
+        new_payloads = [payload for _, payload in self.pending]
+        vectors = np.concatenate([old_vectors] + new_vectors) if new_vectors else np.asarray(old_vectors)
+        # Tabela criada vazia só tem point_id: o schema vem dos payloads novos
+        tables = ([old_payloads] if old_payloads.num_rows else []) + new_payloads
+        payloads = pa.concat_tables(tables, promote_options="default") if tables else old_payloads
+        n_new = sum(t.num_rows for t in new_payloads)
+
+        meta = self._meta()
+        version = meta['version'] + 1
+        vectors_path, payload_path = self._files(version)
+        np.save(vectors_path, vectors)
+        pq.write_table(payloads, payload_path)
+        meta.update(count=len(vectors), version=version)
+        self._write_meta(meta)
+
+        for old in self._files(version - 1):
+            try:
+                old.unlink()
+            except OSError:
+                pass  # Windows: ainda aberto por algum leitor
+        print(f"💾 Índice numpy: {len(vectors)} vetores ({n_new} novos, {len(self.deleted)} removidos, {len(self.moved)} com msg_id atualizado).")
+        self.pending, self.deleted, self.moved = [], set(), {}
+
+    def candidates(self, filters):
+        """Linhas que passam nos filtros (índice de payload do numpy), calculadas uma vez por versão."""
+        key = tuple(sorted(filters.items()))
+        if key not in self.masks:
+            if len(self.masks) >= MASK_CACHE_SIZE:
+                self.masks.clear()
+            self.masks[key] = np.flatnonzero(filter_mask(self.payloads, filters))
+        return self.masks[key]
+
+    def search(self, vector, limit, filters=None, with_vectors=False):
+        return self.search_many(np.asarray(vector, dtype=np.float32)[None, :], limit, filters, with_vectors)[0]
+
+    def search_many(self, queries, limit, filters=None, with_vectors=False):
+        """Top-`limit` exato (cosseno) para cada linha de `queries`.
+
+        Com filtros, só as linhas candidatas são lidas e pontuadas: quanto
+        mais seletivo o filtro, mais rápida a busca. `with_vectors` devolve
+        também o vetor de cada hit (como o `with_vectors` do Qdrant).
+        """
+        self._refresh()
+        if self.vectors is None or not len(self.vectors):
+            return [[] for _ in queries]
+        rows = self.candidates(filters) if filters else None
+        total = len(self.vectors) if rows is None else len(rows)
+        if not total:
+            return [[] for _ in queries]
+        queries = np.asarray(queries, dtype=np.float32)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            if rows is None:
+                block_rows = np.arange(start, min(start + SEARCH_BLOCK_ROWS, total))
+                block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            else:
+                block_rows = rows[start:start + SEARCH_BLOCK_ROWS]
+                block = np.asarray(self.vectors[block_rows], dtype=np.float32)
+            scores = queries @ block.T
+            k = min(limit, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, block_rows[top]], axis=1)
+            if best_scores.shape[1] > limit:
+                keep = np.argpartition(-best_scores, limit - 1, axis=1)[:, :limit]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            rows = rows[order]
+            payloads = self.payloads.take(pa.array(rows)).to_pylist()
+            vectors = np.asarray(self.vectors[rows], dtype=np.float32) if with_vectors else [None] * len(rows)
+            results.append([
+                Hit(p.pop('point_id'), float(s), p, v)
+                for s, p, v in zip(scores[order], payloads, vectors)
+            ])
+        return results
+
+    def location(self):
+        return str(self.dir)
+
+    def close(self):
+        self.vectors = self.payloads = self.version = None
+
+def open_store(collection_name, backend=VECTOR_BACKEND):
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Vector store desconhecido: {backend} (use {VECTOR_BACKENDS})")
+    return NumpyStore(collection_name) if backend == "numpy" else QdrantStore(collection_name)
@@ -1,76 +1,302 @@
 import os
-import torch
+import hashlib
+import queue
+import threading
+import time
+import uuid
+import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
+import pyarrow as pa
+import pyarrow.compute as pc
 from tqdm import tqdm
 import sys
 
+from src.ingestion.dataset import TIMESTAMP_FORMAT, load_messages
+from src.embeddings.cache import EmbeddingCache
+from src.embeddings.stores import VECTOR_BACKEND, open_store
+from src.embeddings.windows import build_windows
+from src.embeddings.encoders import EMBEDDING_BACKEND, CPUEncoderPool, cache_name, default_device, default_workers, load_encoder
+
 # Configurações
 COLLECTION_NAME = "whatsapp_chat"
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-VECTOR_DB_PATH = "./data/qdrant_db"
 BATCH_SIZE = 64
+# Lotes que podem esperar entre uma etapa e a seguinte
+QUEUE_DEPTH = 4
+
+def _message_keys(df):
+    chat = df['chat_id'].astype(str) if 'chat_id' in df.columns else pd.Series('', index=df.index)
+    when = df['date'] + ' ' + df['time']
+    if 'timestamp' in df.columns:
+        # Linhas com data não reconhecida (NaT) ficam com a data/hora originais
+        when = df['timestamp'].astype(str).where(df['timestamp'].notna(), when)
+    return chat + '\x1f' + when + '\x1f' + df['author'].astype(str) + '\x1f' + df['content']
+
+def point_ids(df, earlier=None):
+    """IDs determinísticos (UUID) a partir de (chat, timestamp, autor, conteúdo).
+
+    A mesma mensagem gera sempre o mesmo ID, em qualquer execução. Mensagens
+    idênticas no mesmo minuto recebem um contador de ocorrência para não
+    colidirem; `earlier` traz as mensagens anteriores a `df` que não foram
+    carregadas (ingestões passadas), para o contador seguir de onde parou.
+    """
+    keys = _message_keys(df)
+    occurrence = keys.groupby(keys).cumcount()
+    if earlier is not None and not earlier.empty:
+        occurrence += keys.map(_message_keys(earlier).value_counts()).fillna(0).astype(int)
+    return [
+        str(uuid.UUID(bytes=hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()))
+        for key in keys + '\x1f' + occurrence.astype(str)
+    ]
+
+def message_payload(df):
+    """Payloads em formato colunar (tabela Arrow), sem um dict por mensagem."""
+    # msg_id (posição no chat) permite buscar as vizinhas do hit no índice de mensagens
+    columns = ['date', 'time', 'author', 'content'] + [c for c in ('msg_id', 'chat_id') if c in df.columns]
+    table = pa.Table.from_pandas(df[columns].astype({'author': str}), preserve_index=False)
+    # Timestamp RFC 3339 para o índice datetime do Qdrant (nulo quando a data não foi reconhecida)
+    timestamp = pa.array(df['timestamp'], pa.timestamp('s'))
+    return table.append_column('timestamp', pc.strftime(timestamp, format=TIMESTAMP_FORMAT))
+
+def message_points(df, earlier=None):
+    """Um ponto por mensagem: (DataFrame com `point_id` e texto a vetorizar, payloads)."""
+    points = pd.DataFrame({
+        'point_id': point_ids(df, earlier),
+        'text_to_embed': df['author'].astype(str) + ": " + df['content'],
+    })
+    return points, message_payload(df)
+
+_DONE = object()
+
+class StageStats:
+    """Tempo ocupado e mensagens processadas por uma etapa do pipeline."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        rate = self.items / self.seconds if self.seconds else 0
+        return f"{self.name:<8}{self.items:>10} msgs em {self.seconds:7.1f}s ({rate:,.0f} msgs/s)"
+
+def length_buckets(texts, batch_size):
+    """Lotes de índices com textos de tamanho parecido (menos padding no encoder).
+
+    Dentro de cada lote os índices voltam à ordem original.
+    """
+    order = np.argsort([len(t) for t in texts], kind='stable')
+    return [np.sort(order[i:i + batch_size]) for i in range(0, len(order), batch_size)]
+
+def run_pipeline(batches, stages, depth=QUEUE_DEPTH):
+    """Executa `stages` [(nome, fn(idx, dados) -> dados)] em threads ligadas por filas limitadas.
+
+    Enquanto uma etapa processa um lote, a anterior já trabalha no seguinte;
+    `depth` limita quantos lotes ficam parados em cada fila. O primeiro erro
+    interrompe o pipeline e é relançado. Devolve um StageStats por etapa.
+    """
+    queues = [queue.Queue(maxsize=depth) for _ in stages]
+    stats = [StageStats(name) for name, _ in stages]
+    errors = []
+
+    def worker(fn, inbox, outbox, st):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if errors:
+                continue  # só drena a fila, para não travar a etapa anterior
+            idx, data = item
+            t0 = time.perf_counter()
+            try:
+                result = fn(idx, data)
+            except Exception as e:
+                errors.append(e)
+                continue
+            st.seconds += time.perf_counter() - t0
+            st.items += len(idx)
+            if outbox is not None:
+                outbox.put((idx, result))
+        if outbox is not None:
+            outbox.put(_DONE)
+
+    threads = [
+        threading.Thread(target=worker, args=(fn, queues[i], queues[i + 1] if i + 1 < len(stages) else None, st), daemon=True)
+        for i, ((_, fn), st) in enumerate(zip(stages, stats))
+    ]
+    for t in threads:
+        t.start()
+    for idx in batches:
+        if errors:
+            break
+        queues[0].put((idx, None))
+    queues[0].put(_DONE)
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return stats
+
+def build_vector_store(parquet_path, only_new=False, chat_ids=None, start=None, end=None, rebuild=False,
+                       batch_size=BATCH_SIZE, workers=None, backend=EMBEDDING_BACKEND, profile=None, mode=None,
+                       store=VECTOR_BACKEND):
+    """Cria ou atualiza a coleção.
+
+    Por padrão faz upsert: só as mensagens cujo ID ainda não está na coleção
+    são vetorizadas, e pontos cuja mensagem sumiu do Parquet são apagados.
+    `rebuild` recria a coleção do zero; `only_new` lê só a última ingestão
+    incremental (sem procurar pontos obsoletos). Pontos já indexados cujo
+    `msg_id` mudou (reingestão completa) só têm o payload atualizado.
+
+    Encode, montagem dos pontos e upload rodam em paralelo (run_pipeline),
+    com lotes de `batch_size` mensagens de tamanho parecido. Sem GPU, o
+    encoding é dividido entre `workers` processos (padrão: um por núcleo),
+    e cada chamada leva `batch_size` mensagens por worker.
+    `backend` escolhe o encoder: "torch", "onnx" ou "onnx-int8".
 
-def build_vector_store(parquet_path):
+    `profile` (memory/balanced/disk, ver collection.py) define o layout da
+    coleção; se ela já existir com outro perfil, é migrada sem re-vetorizar.
+    `mode` "windows" indexa janelas de conversa em vez de mensagens; trocar
+    de modo recria a coleção. Janelas usam a posição da mensagem no chat,
+    então esse modo sempre lê os chats inteiros (ignora only_new/start/end).
+    `store` escolhe onde os vetores ficam: "qdrant" ou "numpy" (stores.py).
+    """
     print("🚀 Iniciando Pipeline de Vetorização...")
-    
+
     if not os.path.exists(parquet_path):
         print(f"❌ Arquivo não encontrado: {parquet_path}")
         return
-    
-    df = pd.read_parquet(parquet_path)
-    print(f"📂 Dados carregados: {len(df)} mensagens.")
-
-    # Prepara texto
-    df['text_to_embed'] = df['author'] + ": " + df['content']
-    documents = df['text_to_embed'].tolist()
-    metadata = df[['date', 'time', 'author', 'content']].to_dict('records')
-
-    # Carrega Modelo
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"🧠 Carregando modelo '{MODEL_NAME}' no dispositivo: {device.upper()}")
-    
-    encoder = SentenceTransformer(MODEL_NAME, device=device)
-
-    # Inicializa Qdrant
-    client = QdrantClient(path=VECTOR_DB_PATH)
-    
-    if client.collection_exists(COLLECTION_NAME):
-        client.delete_collection(COLLECTION_NAME)
-    
-    client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=models.VectorParams(
-            size=encoder.get_sentence_embedding_dimension(),
-            distance=models.Distance.COSINE
-        )
-    )
-
-    print("⚡ Gerando embeddings e indexando...")
-    
-    total_batches = len(documents) // BATCH_SIZE + 1
-    
-    for i in tqdm(range(0, len(documents), BATCH_SIZE), total=total_batches):
-        batch_docs = documents[i : i + BATCH_SIZE]
-        batch_meta = metadata[i : i + BATCH_SIZE]
-        
-        embeddings = encoder.encode(batch_docs, show_progress_bar=False)
-        
-        points = [
-            models.PointStruct(
-                id=i + idx,
-                vector=emb.tolist(),
-                payload=meta
+
+    # Inicializa o vector store (Qdrant ou índice numpy)
+    store = open_store(COLLECTION_NAME, store)
+    try:
+        exists = store.exists()
+        info = store.info()
+        mode = mode or info['mode']
+        if exists and mode != info['mode']:
+            print(f"🔁 Modo de indexação mudou ({info['mode']} → {mode}): recriando a coleção...")
+            rebuild = True
+        if rebuild and exists:
+            store.drop()
+            exists = False
+        profile = profile or info['profile']
+        if exists and profile != info['profile']:
+            store.set_profile(profile)
+
+        if mode == "windows" and (only_new or start or end):
+            print("⚠️ Modo janelas lê os chats inteiros: only_new/start/end ignorados.")
+            only_new, start, end = False, None, None
+
+        # chat_ids/start/end podam partições quando parquet_path é o corpus
+        df = load_messages(parquet_path, chat_ids=chat_ids, start=start, end=end, only_new=only_new)
+        print(f"📂 Dados carregados: {len(df)} mensagens{' novas' if only_new else ''}.")
+
+        earlier = None
+        if only_new and not df.empty and df['timestamp'].notna().any():
+            # Cópias idênticas no mesmo minuto podem ter ficado na ingestão anterior:
+            # elas contam para o contador de ocorrência dos IDs
+            earlier = load_messages(parquet_path, start=df['timestamp'].min())
+            earlier = earlier[earlier['ingest_batch'] < df['ingest_batch'].min()]
+
+        points, payload = build_windows(df) if mode == "windows" else message_points(df, earlier)
+        unit = "janelas" if mode == "windows" else "mensagens"
+        if mode == "windows":
+            print(f"🪟 {len(df)} mensagens agrupadas em {len(points)} janelas.")
+
+        if exists:
+            # IDs não dependem do msg_id: ele é conferido à parte logo abaixo
+            stored = store.msg_ids() if mode != "windows" else dict.fromkeys(store.ids())
+            current = set(stored)
+            # Só dá para saber o que é obsoleto quando o Parquet inteiro foi lido
+            if not (only_new or chat_ids or start or end):
+                stale = list(current - set(points['point_id']))
+                if stale:
+                    print(f"🗑️ Removendo {len(stale)} pontos que não existem mais no Parquet...")
+                    store.delete(stale)
+                    current.difference_update(stale)
+            new = ~points['point_id'].isin(current).to_numpy()
+            if 'msg_id' in payload.column_names:
+                # Reingestão completa renumera o msg_id: pontos existentes apontariam
+                # para as vizinhas erradas no índice de mensagens
+                kept = points['point_id'][~new].tolist()
+                positions = payload.column('msg_id').filter(pa.array(~new)).to_pylist()
+                moved = {pid: pos for pid, pos in zip(kept, positions) if stored.get(pid) != pos}
+                if moved:
+                    print(f"🔢 Atualizando o msg_id de {len(moved)} pontos já indexados...")
+                    store.update_msg_ids(moved)
+            points, payload = points[new], payload.filter(pa.array(new))
+            print(f"♻️ {len(current)} pontos já indexados; {len(points)} {unit} a vetorizar.")
+
+        if points.empty:
+            store.commit()
+            print("✅ Nada para vetorizar.")
+            return
+
+        documents = points['text_to_embed'].tolist()
+        ids = points['point_id'].tolist()
+
+        # O modelo só é carregado se algum texto não estiver no cache
+        cache = EmbeddingCache(cache_name(MODEL_NAME, backend))
+        encoder = None
+        device = default_device(backend)
+        if cache.dim is None or cache.missing(documents):
+            workers = workers or default_workers()
+            # Carregado antes das threads do pipeline: o pool de CPU usa fork
+            if device == "cpu" and workers > 1:
+                print(f"🧠 Carregando modelo '{MODEL_NAME}' ({backend}) em {workers} processos de CPU")
+                encoder = CPUEncoderPool(MODEL_NAME, workers=workers, backend=backend)
+                # Cada worker recebe um lote inteiro por chamada: com `batch_size` dividido
+                # em fatias pequenas o custo de IPC/pickle domina o encoding
+                batch_size *= workers
+            else:
+                print(f"🧠 Carregando modelo '{MODEL_NAME}' ({backend}) no dispositivo: {device.upper()}")
+                encoder = load_encoder(MODEL_NAME, backend, device=device)
+
+        def encode(texts):
+            nonlocal encoder
+            if encoder is None:  # outro processo despejou textos do cache depois da checagem
+                encoder = load_encoder(MODEL_NAME, backend, device=device)
+            return encoder.encode(texts, show_progress_bar=False)
+
+        if not exists:
+            store.create(cache.dim or encoder.get_sentence_embedding_dimension(), profile, mode)
+
+        print(f"⚡ Gerando embeddings e indexando (lotes de {batch_size})...")
+
+        progress = tqdm(total=len(documents))
+
+        def encode_stage(idx, _):
+            return cache.encode([documents[i] for i in idx], encode)
+
+        def payload_stage(idx, embeddings):
+            # Fatia colunar da tabela de payloads: nada de dict/PointStruct por mensagem
+            return embeddings, payload.take(pa.array(idx))
+
+        def upload_stage(idx, batch):
+            embeddings, batch_payload = batch
+            store.upload([ids[i] for i in idx], embeddings, batch_payload)
+            progress.update(len(idx))
+
+        start_time = time.perf_counter()
+        try:
+            stats = run_pipeline(
+                length_buckets(documents, batch_size),
+                [("encode", encode_stage), ("payload", payload_stage), ("upload", upload_stage)],
             )
-            for idx, (emb, meta) in enumerate(zip(embeddings, batch_meta))
-        ]
-        
-        client.upload_points(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
-
-    print(f"✅ Sucesso! Banco vetorial salvo em '{VECTOR_DB_PATH}'")
+        finally:
+            if isinstance(encoder, CPUEncoderPool):
+                encoder.close()
+        store.commit()
+        progress.close()
+        elapsed = time.perf_counter() - start_time
+
+        print(f"⏱️ {len(documents)} {unit} em {elapsed:.1f}s ({len(documents) / elapsed:,.0f}/s)")
+        for st in stats:
+            print(f"   {st}")
+        cache.flush()
+        print(f"♻️ Cache de embeddings: {cache.hits} reaproveitados, {cache.misses} calculados.")
+        print(f"✅ Sucesso! Banco vetorial salvo em '{store.location()}'")
+    finally:
+        store.close()
     # REMOVIDO: Bloco de teste de busca que causava crash no Streamlit
@@ -0,0 +1,101 @@
+import hashlib
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+from src.ingestion.dataset import TIMESTAMP_FORMAT
+
+# Configurações
+# Uma pausa maior que esta começa outra conversa (outra janela, sem sobreposição)
+WINDOW_MAX_GAP = pd.Timedelta(minutes=30)
+# Orçamento por janela, abaixo do limite de 128 tokens do MiniLM
+WINDOW_MAX_TOKENS = 120
+# Mensagens repetidas no início da janela seguinte quando o corte é por tamanho
+WINDOW_OVERLAP = 2
+
+def approx_tokens(text):
+    """Estimativa barata de tokens (subwords) para português: ~1.3 por palavra."""
+    return int(len(text.split()) * 1.3) + 1
+
+def message_positions(df):
+    """Posição de cada mensagem dentro do seu chat: o `msg_id` da ingestão (ou a ordem do Parquet, em dados antigos)."""
+    if 'msg_id' in df.columns:
+        return df['msg_id']
+    if 'chat_id' in df.columns:
+        return df.groupby('chat_id', observed=True).cumcount()
+    return pd.Series(range(len(df)), index=df.index)
+
+def _window_id(chat_id, first, last, text):
+    key = f"{chat_id}\x1f{first}\x1f{last}\x1f{text}"
+    return str(uuid.UUID(bytes=hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()))
+
+def _split(lines, stamps, max_gap, max_tokens, overlap):
+    """Índices [início, fim] de cada janela de uma sequência de mensagens.
+
+    A sobreposição encolhe até caber no orçamento junto com a mensagem que
+    abriu a janela nova; uma mensagem sozinha acima do orçamento vira uma
+    janela só dela (o encoder trunca o excesso).
+    """
+    windows = []
+    start, tokens = 0, 0
+    for i, line in enumerate(lines):
+        cost = approx_tokens(line)
+        gap = i > start and pd.notna(stamps[i]) and pd.notna(stamps[i - 1]) and stamps[i] - stamps[i - 1] > max_gap
+        if i > start and (gap or tokens + cost > max_tokens):
+            windows.append((start, i - 1))
+            # Sobreposição só quando a conversa continua (corte por tamanho)
+            keep = 0 if gap else min(overlap, i - 1 - start)
+            while keep and sum(approx_tokens(l) for l in lines[i - keep:i]) + cost > max_tokens:
+                keep -= 1
+            start = i - keep
+            tokens = sum(approx_tokens(l) for l in lines[start:i])
+        tokens += cost
+    if lines:
+        windows.append((start, len(lines) - 1))
+    return windows
+
+def build_windows(df, max_gap=WINDOW_MAX_GAP, max_tokens=WINDOW_MAX_TOKENS, overlap=WINDOW_OVERLAP):
+    """Agrupa mensagens consecutivas de cada chat em janelas de conversa.
+
+    Devolve (DataFrame com `point_id` e o texto a vetorizar, tabela Arrow
+    de payloads) com uma linha por janela. O payload traz o intervalo de
+    posições `msg_start`..`msg_end`, os autores e as próprias mensagens,
+    para o chat expandir o hit.
+    """
+    df = df.assign(msg_pos=message_positions(df))
+    has_chat = 'chat_id' in df.columns
+    # No corpus a leitura vem por mês; as janelas seguem a ordem das mensagens
+    df = df.sort_values((['chat_id'] if has_chat else []) + ['msg_pos'], kind='stable')
+    groups = df.groupby('chat_id', observed=True, sort=False) if has_chat else [(None, df)]
+
+    rows, payloads = [], []
+    for chat_id, chat in groups:
+        authors = chat['author'].astype(str).tolist()
+        contents = chat['content'].tolist()
+        lines = [f"{a}: {c}" for a, c in zip(authors, contents)]
+        stamps = chat['timestamp'].tolist()
+        positions = chat['msg_pos'].tolist()
+        dates, times = chat['date'].tolist(), chat['time'].tolist()
+
+        for first, last in _split(lines, stamps, max_gap, max_tokens, overlap):
+            text = "\n".join(lines[first:last + 1])
+            start_ts = stamps[first]
+            payload = {
+                'msg_start': positions[first],
+                'msg_end': positions[last],
+                'date': dates[first],
+                'time': times[first],
+                'timestamp': start_ts.strftime(TIMESTAMP_FORMAT) if pd.notna(start_ts) else None,
+                'author': sorted(set(authors[first:last + 1])),
+                'content': text,
+                'messages': [
+                    {'msg_id': positions[i], 'date': dates[i], 'time': times[i], 'author': authors[i], 'content': contents[i]}
+                    for i in range(first, last + 1)
+                ],
+            }
+            if has_chat:
+                payload['chat_id'] = str(chat_id)
+            rows.append((_window_id(chat_id, positions[first], positions[last], text), text))
+            payloads.append(payload)
+    return pd.DataFrame(rows, columns=['point_id', 'text_to_embed']), pa.Table.from_pylist(payloads)
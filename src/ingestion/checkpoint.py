@@ -0,0 +1,60 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+# Quantos bytes do fim da parte já processada entram no hash de verificação
+TAIL_BYTES = 64 * 1024
+
+def checkpoint_path(parquet_path):
+    return Path(f"{parquet_path}.checkpoint.json")
+
+def load_checkpoint(parquet_path):
+    path = checkpoint_path(parquet_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(parquet_path, checkpoint):
+    path = checkpoint_path(parquet_path)
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(path)
+
+def tail_hash(f, offset):
+    """SHA-256 dos últimos TAIL_BYTES antes de `offset` num arquivo binário aberto."""
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+def resume_offset(parquet_path, schema, size, hash_at):
+    """Offset a partir do qual um novo export pode ser lido, ou None.
+
+    O novo export (de `size` bytes) só é tratado como continuação do anterior
+    se for pelo menos do mesmo tamanho, se `hash_at(offset)` bater com o
+    hash salvo e se o dataset existente (um diretório de partes; o Parquet
+    único do formato antigo não conta) tiver o schema atual.
+    """
+    checkpoint = load_checkpoint(parquet_path)
+    parts = sorted(Path(parquet_path).glob('part-*.parquet')) if Path(parquet_path).is_dir() else []
+    if checkpoint is None or not parts:
+        return None
+    offset = checkpoint.get('byte_offset', 0)
+    if size < offset:
+        return None
+    if hash_at(offset) != checkpoint.get('tail_hash'):
+        return None
+    if not pq.read_schema(parts[-1]).remove_metadata().equals(schema):
+        return None
+    return offset
+
+def latest_batch(parquet_path):
+    """Id da última ingestão registrada (None se não houver checkpoint)."""
+    checkpoint = load_checkpoint(parquet_path)
+    return checkpoint['ingest_batch'] if checkpoint else None
@@ -0,0 +1,138 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.ingestion.checkpoint import latest_batch
+
+# Dataset particionado (Hive: chat_id=<id>/month=<AAAA-MM>/) com vários chats
+CORPUS_DIR = "data/processed/corpus"
+# Formato do `timestamp` nos payloads (RFC 3339 sem fuso; ordena como texto)
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+def is_partitioned(path):
+    """True para o corpus multi-chat (não para o diretório de partes de um chat só)."""
+    return any(Path(path).glob('chat_id=*'))
+
+def part_path(path, ingest_batch):
+    """Arquivo de uma ingestão dentro do dataset de um chat (`chat_history.parquet/`)."""
+    return Path(path) / f"part-{ingest_batch:05d}.parquet"
+
+def build_filters(path, chat_ids=None, start=None, end=None, only_new=False):
+    """Filtros do pyarrow para ler só o necessário.
+
+    Em um dataset particionado, `chat_id` e `month` são colunas de partição:
+    o pyarrow descarta os diretórios que não batem sem abrir os arquivos.
+    Em um Parquet único, o filtro de `timestamp` usa as estatísticas dos
+    row groups.
+    """
+    filters = []
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if is_partitioned(path):
+        if chat_ids:
+            filters.append(('chat_id', 'in', list(chat_ids)))
+        if start is not None:
+            filters.append(('month', '>=', start.strftime('%Y-%m')))
+        if end is not None:
+            filters.append(('month', '<=', end.strftime('%Y-%m')))
+    elif only_new:
+        batch = latest_batch(path)
+        if batch is not None:
+            filters.append(('ingest_batch', '==', batch))
+
+    if start is not None:
+        filters.append(('timestamp', '>=', start))
+    if end is not None:
+        # Data sem hora ("2024-03-31") inclui o dia inteiro
+        if end == end.normalize():
+            filters.append(('timestamp', '<', end + pd.Timedelta(days=1)))
+        else:
+            filters.append(('timestamp', '<=', end))
+    return filters or None
+
+def load_messages(path, chat_ids=None, start=None, end=None, only_new=False, columns=None):
+    """Lê mensagens de um Parquet único ou do corpus particionado.
+
+    `chat_ids` e o intervalo `start`/`end` podam partições; `only_new`
+    (só para o Parquet único) restringe à última ingestão incremental.
+    """
+    filters = build_filters(path, chat_ids=chat_ids, start=start, end=end, only_new=only_new)
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+def search_filters(authors=None, chat_ids=None, start=None, end=None):
+    """Filtros de busca normalizados (hashable, servem de chave de cache) ou None.
+
+    Como em `build_filters`, uma data final sem hora inclui o dia inteiro;
+    `end` sai como limite exclusivo.
+    """
+    filters = {}
+    if authors:
+        filters['authors'] = tuple(sorted(set(authors)))
+    if chat_ids:
+        filters['chat_ids'] = tuple(sorted(set(chat_ids)))
+    if start is not None:
+        filters['start'] = pd.Timestamp(start).strftime(TIMESTAMP_FORMAT)
+    if end is not None:
+        end = pd.Timestamp(end)
+        end += pd.Timedelta(days=1) if end == end.normalize() else pd.Timedelta(seconds=1)
+        filters['end'] = end.strftime(TIMESTAMP_FORMAT)
+    return filters or None
+
+def filter_mask(table, filters):
+    """Linhas de uma tabela de payloads (Arrow) que passam nos filtros, como array booleano.
+
+    Em janelas, `author` é uma lista: basta um dos autores da janela.
+    """
+    mask = np.ones(table.num_rows, dtype=bool)
+    if not filters:
+        return mask
+    for field, column_name in (('authors', 'author'), ('chat_ids', 'chat_id')):
+        if field not in filters:
+            continue
+        if column_name not in table.column_names:
+            return np.zeros(table.num_rows, dtype=bool)
+        column = table.column(column_name).combine_chunks()
+        values = pa.array(filters[field], pa.string())
+        if pa.types.is_list(column.type):
+            found = pc.is_in(pc.list_flatten(column), value_set=values).to_numpy(zero_copy_only=False)
+            matches = np.zeros(table.num_rows, dtype=bool)
+            matches[pc.list_parent_indices(column).to_numpy()[found]] = True
+        else:
+            matches = pc.fill_null(pc.is_in(column.cast(pa.string()), value_set=values), False).to_numpy(zero_copy_only=False)
+        mask &= matches
+    timestamp = table.column('timestamp') if 'timestamp' in table.column_names else None
+    for field, compare in (('start', pc.greater_equal), ('end', pc.less)):
+        if field in filters:
+            if timestamp is None:
+                return np.zeros(table.num_rows, dtype=bool)
+            mask &= pc.fill_null(compare(timestamp, filters[field]), False).to_numpy(zero_copy_only=False)
+    return mask
+
+def media_index_path(path):
+    """Índice de anexos ao lado do Parquet (ou `_media.json` dentro do diretório do chat)."""
+    path = Path(path)
+    return path / "_media.json" if path.is_dir() else Path(f"{path}.media.json")
+
+def load_media_index(path):
+    """Lista de anexos indexados na ingestão (arquivo, autor, data, tamanho no .zip)."""
+    index_path = media_index_path(path)
+    if not index_path.exists():
+        return []
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_media_index(path, entries, append=False):
+    if append:
+        # Um arquivo por entrada; a versão citada por alguma mensagem prevalece
+        merged = {e['file']: e for e in load_media_index(path)}
+        for entry in entries:
+            if entry['file'] not in merged or entry['author']:
+                merged[entry['file']] = entry
+        entries = list(merged.values())
+    with open(media_index_path(path), 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
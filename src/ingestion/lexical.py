@@ -0,0 +1,137 @@
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Configurações
+# Parâmetros clássicos do BM25 (saturação do tf e normalização pelo tamanho)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Tokens maiores que isso (hashes, "kkkkkkkk...") ficam fora do índice
+MAX_TERM_LENGTH = 32
+# Já sem acento (ver fold_text); aparecem em quase toda mensagem e só inflam as listas
+STOPWORDS = frozenset("""
+    a o e as os um uma uns umas de do da dos das em no na nos nas num numa ao aos
+    por pelo pela pelos pelas para pra pro com sem que se nao sim mas ou como ja
+    eu tu ele ela nos vos eles elas voce voces me te lhe meu minha teu tua seu sua
+    isso isto esse essa este esta ai la ta tem foi ser sao era e
+""".split())
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def _fold_table():
+    """Tabela de `str.translate` que tira acentos (á -> a, ç -> c) do Latin-1 e Latin Extended-A."""
+    table = {}
+    for code in range(0xC0, 0x180):
+        base = unicodedata.normalize('NFKD', chr(code))[0]
+        if base != chr(code) and base.isascii():
+            table[code] = base
+    return table
+
+FOLD_TABLE = _fold_table()
+
+def fold_text(text):
+    return text.lower().translate(FOLD_TABLE)
+
+def tokenize(text):
+    """Termos de uma pergunta, com a mesma normalização usada na indexação."""
+    return [
+        t for t in TOKEN_PATTERN.findall(fold_text(text))
+        if t not in STOPWORDS and len(t) <= MAX_TERM_LENGTH
+    ]
+
+def term_hash(term):
+    """Hash de 64 bits do termo: o índice guarda só os hashes, não o vocabulário."""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def write_postings(index_dir, contents):
+    """Grava as listas invertidas BM25 do `content` de cada mensagem (linha = posição em `contents`).
+
+    Arquivos: `term_hashes.npy` (uint64 ordenado), `offsets.npy` (início da
+    lista de cada termo), `postings.npy` (linha da mensagem, uint32),
+    `tfs.npy` (frequência do termo, uint16) e `doc_lengths.npy`.
+    Devolve o número de termos e o tamanho médio das mensagens.
+    """
+    n_docs = len(contents)
+    tokens = contents.astype(str).str.lower().str.translate(FOLD_TABLE).str.findall(TOKEN_PATTERN)
+    flat = tokens.explode().dropna()
+    flat = flat[~flat.isin(STOPWORDS) & (flat.str.len() <= MAX_TERM_LENGTH)]
+    doc_ids = np.asarray(flat.index, dtype=np.int64)
+    codes, terms = pd.factorize(flat)
+
+    # Termos ordenados pelo hash: a busca é um searchsorted
+    hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+    order = np.argsort(hashes)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    keys, tfs = np.unique(rank[codes].astype(np.int64) * max(n_docs, 1) + doc_ids, return_counts=True)
+    offsets = np.searchsorted(keys // max(n_docs, 1), np.arange(len(terms) + 1))
+    doc_lengths = np.bincount(doc_ids, minlength=n_docs)
+
+    np.save(index_dir / "term_hashes.npy", hashes[order])
+    np.save(index_dir / "offsets.npy", offsets.astype(np.int64))
+    np.save(index_dir / "postings.npy", (keys % max(n_docs, 1)).astype(np.uint32))
+    np.save(index_dir / "tfs.npy", np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16))
+    np.save(index_dir / "doc_lengths.npy", np.minimum(doc_lengths, np.iinfo(np.uint16).max).astype(np.uint16))
+    return len(terms), float(doc_lengths.mean()) if n_docs else 0.0
+
+class Bm25:
+    """Busca BM25 sobre segmentos gravados por `write_postings`, abertos com memory-map.
+
+    `segments` é uma lista de (pasta, primeira linha global do segmento); o
+    idf usa a frequência do termo somada em todos os segmentos.
+    """
+
+    def __init__(self, segments, n_docs, avgdl):
+        self.segments = []
+        for index_dir, offset in segments:
+            load = lambda name: np.load(index_dir / f"{name}.npy", mmap_mode='r')
+            self.segments.append((
+                load("term_hashes"), load("offsets"), load("postings"), load("tfs"), load("doc_lengths"), offset,
+            ))
+        self.n_docs, self.avgdl = n_docs, avgdl or 1.0
+
+    def _postings(self, term):
+        """Linhas globais, tf e tamanho das mensagens com o termo (hash), juntando os segmentos."""
+        docs, tfs, lengths = [], [], []
+        for term_hashes, offsets, postings, seg_tfs, doc_lengths, offset in self.segments:
+            i = np.searchsorted(term_hashes, term)
+            if i >= len(term_hashes) or term_hashes[i] != term:
+                continue
+            local = np.asarray(postings[offsets[i]:offsets[i + 1]], dtype=np.int64)
+            docs.append(local + offset)
+            tfs.append(np.asarray(seg_tfs[offsets[i]:offsets[i + 1]], dtype=np.float32))
+            lengths.append(np.asarray(doc_lengths[local], dtype=np.float32))
+        if not docs:
+            return None
+        return np.concatenate(docs), np.concatenate(tfs), np.concatenate(lengths)
+
+    def search(self, query, limit, mask=None):
+        """[(linha, score)] das `limit` mensagens com maior BM25; `mask` restringe as linhas."""
+        hashes = np.array([term_hash(t) for t in set(tokenize(query))], dtype=np.uint64)
+        if not len(hashes) or not self.segments:
+            return []
+
+        rows, scores = [], []
+        for term in hashes:
+            found = self._postings(term)
+            if found is None:
+                continue
+            docs, tf, dl = found
+            idf = np.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            rows.append(docs)
+            scores.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / self.avgdl)))
+        if not rows:
+            return []
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        if mask is not None:
+            keep = mask[unique]
+            unique, totals = unique[keep], totals[keep]
+        if not len(unique):
+            return []
+        k = min(limit, len(unique))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top])]
+        return [(int(unique[i]), float(totals[i])) for i in top]
@@ -0,0 +1,238 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.ingestion.dataset import TIMESTAMP_FORMAT, filter_mask, is_partitioned, load_messages
+from src.ingestion.lexical import Bm25, write_postings
+
+# Configurações
+# Máscaras de filtro (autor/chat/período) guardadas por versão do índice
+MASK_CACHE_SIZE = 64
+# Mensagens lidas por vez ao reconstruir o índice de um chat (um segmento por lote)
+INDEX_BATCH_SIZE = 50_000
+
+def message_index_path(path):
+    """Índice de mensagens ao lado do Parquet (ou `_index/` dentro do diretório, ignorado pelo pyarrow)."""
+    path = Path(path)
+    return path / "_index" if path.is_dir() else Path(f"{path}.index")
+
+def _message_table(df):
+    """Colunas devolvidas pelo índice (hits léxicos, vizinhas) e usadas nos filtros."""
+    columns = ['msg_id', 'date', 'time', 'author', 'content'] + (['chat_id'] if 'chat_id' in df.columns else [])
+    table = pa.Table.from_pandas(df[columns].astype({'author': str}), preserve_index=False)
+    timestamp = pc.strftime(pa.array(df['timestamp'], pa.timestamp('s')), format=TIMESTAMP_FORMAT)
+    return table.append_column('timestamp', timestamp).replace_schema_metadata(None)
+
+def _read_meta(index_dir):
+    path = index_dir / "meta.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+def _segments(meta):
+    # Índices de antes dos segmentos: uma única pasta com o nome da versão
+    return meta.get('segments') or [
+        {'name': str(meta['version']), 'docs': meta['docs'], 'terms': meta['terms'], 'avgdl': meta['avgdl']}
+    ]
+
+class MessageIndexWriter:
+    """Grava o índice de mensagens em segmentos, um por lote de mensagens recebido.
+
+    Cada segmento é uma pasta com `messages.arrow` (Arrow IPC, lido com
+    memory-map) e as listas invertidas de `write_postings`, com linhas
+    locais; a linha global é a do segmento somada ao total dos anteriores.
+    `meta.json` lista os segmentos e guarda onde começa cada chat, então
+    (chat_id, msg_id) -> linha é uma soma. Com `append`, os segmentos já
+    publicados são mantidos e os novos entram no fim (mensagens de um chat
+    precisam chegar em ordem de `msg_id`); sem ele, `commit` publica só os
+    segmentos novos. Nada fica visível para os leitores antes do `commit`.
+    """
+
+    def __init__(self, path, append=False):
+        self.dir = message_index_path(path)
+        meta = _read_meta(self.dir) if append else None
+        self.segments = _segments(meta) if meta else []
+        self.chats = {chat_id: list(span) for chat_id, span in meta['chats'].items()} if meta else {}
+        self.docs = meta['docs'] if meta else 0
+
+    def add(self, df):
+        """Grava as mensagens de `df` (com `msg_id` e, no corpus, `chat_id`) como um segmento novo."""
+        if df.empty:
+            return
+        df = df.reset_index(drop=True)
+        name = str(time.time_ns())
+        segment_dir = self.dir / name
+        segment_dir.mkdir(parents=True)
+        table = _message_table(df)
+        with pa.OSFile(str(segment_dir / "messages.arrow"), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        n_terms, avgdl = write_postings(segment_dir, df['content'])
+
+        # Linha inicial, quantidade e primeiro msg_id de cada chat ("" no chat único)
+        keys = df['chat_id'].astype(str) if 'chat_id' in df.columns else pd.Series("", index=df.index)
+        for chat_id, rows in keys.groupby(keys, sort=False).indices.items():
+            start = self.docs + int(rows[0])
+            if chat_id not in self.chats:
+                self.chats[chat_id] = [start, len(rows), int(df['msg_id'].iat[rows[0]])]
+            elif sum(self.chats[chat_id][:2]) == start:
+                self.chats[chat_id][1] += len(rows)
+            else:
+                raise ValueError(f"Mensagens do chat {chat_id!r} fora de ordem no índice")
+        self.segments.append({'name': name, 'docs': len(df), 'terms': n_terms, 'avgdl': avgdl})
+        self.docs += len(df)
+
+    def commit(self):
+        """Publica os segmentos (troca atômica do `meta.json`) e apaga os que saíram."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        length = sum(seg['avgdl'] * seg['docs'] for seg in self.segments)
+        meta = {
+            'version': time.time_ns(), 'docs': self.docs, 'terms': sum(seg['terms'] for seg in self.segments),
+            'avgdl': length / self.docs if self.docs else 0.0, 'chats': self.chats, 'segments': self.segments,
+        }
+        tmp_meta = self.dir / "meta.json.tmp"
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_meta, self.dir / "meta.json")
+        names = {seg['name'] for seg in self.segments}
+        for old in self.dir.iterdir():
+            if old.is_dir() and old.name not in names:
+                shutil.rmtree(old, ignore_errors=True)
+        print(f"🔤 Índice de mensagens: {self.docs} mensagens em {len(self.segments)} segmento(s) ({self.dir})")
+        return meta
+
+def _chat_frames(path, batch_size=INDEX_BATCH_SIZE):
+    """Mensagens de um chat único em ordem de `msg_id`, em DataFrames de até `batch_size` linhas."""
+    path = Path(path)
+    files = sorted(path.glob('part-*.parquet')) if path.is_dir() else [path]
+    next_id = 0
+    for file in files:
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            if 'msg_id' not in df.columns:
+                # Parquet de antes do msg_id: posição na ordem de leitura
+                df['msg_id'] = np.arange(next_id, next_id + len(df))
+            next_id += len(df)
+            yield df
+
+def build_message_index(path):
+    """Reconstrói o índice de mensagens inteiro (ver MessageIndexWriter).
+
+    Lê um chat por vez no corpus e, no chat único, as partes em lotes de
+    INDEX_BATCH_SIZE mensagens: a memória fica limitada ao maior chat do
+    corpus ou a um lote, nunca ao dataset inteiro.
+    """
+    writer = MessageIndexWriter(path)
+    if is_partitioned(path):
+        chat_ids = sorted(unquote(d.name.split('=', 1)[1]) for d in Path(path).glob('chat_id=*') if d.is_dir())
+        for chat_id in chat_ids:
+            df = load_messages(path, chat_ids=[chat_id])
+            df['chat_id'] = df['chat_id'].astype(str)
+            if 'msg_id' not in df.columns:
+                df['msg_id'] = np.arange(len(df))
+            writer.add(df.sort_values('msg_id', kind='stable'))
+    else:
+        for df in _chat_frames(path):
+            writer.add(df)
+    return writer.commit()
+
+class MessageIndex:
+    """Leitura do índice de mensagens (MessageIndexWriter): BM25, filtros e mensagens por posição.
+
+    Não precisa de encoder nem de vector store. Quando outra ingestão grava
+    uma versão nova, a próxima chamada recarrega.
+    """
+
+    def __init__(self, path):
+        self.dir = message_index_path(path)
+        self.version = None
+
+    def exists(self):
+        return (self.dir / "meta.json").exists()
+
+    def current_version(self):
+        return json.loads((self.dir / "meta.json").read_text())['version'] if self.exists() else None
+
+    def _refresh(self):
+        meta = json.loads((self.dir / "meta.json").read_text())
+        if meta['version'] == self.version:
+            return
+        tables, postings, offset = [], [], 0
+        for seg in _segments(meta):
+            segment_dir = self.dir / seg['name']
+            tables.append(pa.ipc.open_file(pa.memory_map(str(segment_dir / "messages.arrow"))).read_all())
+            postings.append((segment_dir, offset))
+            offset += seg['docs']
+        # Concatenação sem cópia: cada segmento vira um chunk das colunas
+        self.messages = pa.concat_tables(tables) if tables else pa.table({})
+        self.bm25 = Bm25(postings, meta['docs'], meta['avgdl'])
+        self.chats = meta['chats']
+        self.masks = {}
+        self.version = meta['version']
+
+    def mask(self, filters):
+        """Máscara das mensagens que passam nos filtros, calculada uma vez por versão."""
+        key = tuple(sorted(filters.items()))
+        if key not in self.masks:
+            if len(self.masks) >= MASK_CACHE_SIZE:
+                self.masks.clear()
+            self.masks[key] = filter_mask(self.messages, filters)
+        return self.masks[key]
+
+    def search(self, query, limit, filters=None):
+        """[(linha, score)] das `limit` mensagens com maior BM25 para a pergunta (e os filtros)."""
+        self._refresh()
+        return self.bm25.search(query, limit, self.mask(filters) if filters else None)
+
+    def documents(self, rows):
+        """Mensagens (dicts) das linhas pedidas, numa única leitura."""
+        self._refresh()
+        return self.messages.take(pa.array(rows, pa.int64())).to_pylist()
+
+    def neighbors(self, spans, radius):
+        """Trechos (chat_id, primeiro msg_id, último msg_id) com `radius` mensagens de cada lado.
+
+        Trechos que se sobrepõem ou se encostam no mesmo chat viram um só, e
+        todas as linhas saem de uma única leitura. Devolve uma lista de
+        mensagens por trecho resultante, na ordem do trecho mais relevante de
+        cada um; trechos de chats fora do índice são ignorados.
+        """
+        self._refresh()
+        by_chat = {}
+        for order, (chat_id, first, last) in enumerate(spans):
+            key = str(chat_id) if chat_id is not None else ""
+            if key not in self.chats:
+                continue
+            start, count, first_id = self.chats[key]
+            lo = max(start, start + first - first_id - radius)
+            hi = min(start + count - 1, start + last - first_id + radius)
+            if lo <= hi:
+                by_chat.setdefault(key, []).append([lo, hi, order])
+
+        ranges = []
+        for items in by_chat.values():
+            items.sort()
+            current = items[0]
+            for lo, hi, order in items[1:]:
+                if lo <= current[1] + 1:
+                    current[1], current[2] = max(current[1], hi), min(current[2], order)
+                else:
+                    ranges.append(current)
+                    current = [lo, hi, order]
+            ranges.append(current)
+        if not ranges:
+            return []
+        ranges.sort(key=lambda r: r[2])
+
+        docs = self.documents(np.concatenate([np.arange(lo, hi + 1) for lo, hi, _ in ranges]))
+        out, at = [], 0
+        for lo, hi, _ in ranges:
+            out.append(docs[at:at + hi - lo + 1])
+            at += hi - lo + 1
+        return out
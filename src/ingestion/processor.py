@@ -1,40 +1,239 @@
+import io
+import os
 import re
+import shutil
+import zipfile
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import sys
 
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ingestion.checkpoint import load_checkpoint, save_checkpoint, tail_hash, resume_offset
+from src.ingestion.dataset import CORPUS_DIR, part_path, save_media_index
+from src.ingestion.message_index import MessageIndexWriter, build_message_index
+
+# Mensagens de mídia/sistema que não viram linha no dataset
+SKIP_MARKERS = ["<Media omitted>", "<Mídia omitida>", "null"]
+
+# Placeholders de mídia (export "sem mídia") contados nas estatísticas
+MEDIA_MARKERS = ["<Media omitted>", "<Mídia omitida>", "omitted", "omitida"]
+
+# Anexos citados no texto: iOS "<attached: 00000012-PHOTO-...jpg>" e
+# Android "IMG-20231231-WA0001.jpg (file attached)"
+ATTACHMENT_PATTERN = re.compile(
+    r'<(?:attached|anexado):\s*([^>]+)>|^(\S.*?\.\w{2,5})\s+\((?:file attached|arquivo anexado)\)'
+)
+
+# Quantidade de mensagens por record batch / row group no modo streaming
+STREAM_BATCH_SIZE = 50_000
+
+# Abaixo disso não compensa abrir um processo por pedaço do arquivo
+MIN_CHUNK_BYTES = 1 << 20
+
+# Placeholders que só aparecem em exports em português (dia antes do mês)
+PT_MARKERS = ["<Mídia omitida>", "omitida", "(arquivo anexado)", "<anexado:"]
+
+MESSAGE_COLUMNS = ['date', 'time', 'author', 'content']
+
+# `date`/`time` ficam como texto original; `timestamp` é a versão tipada,
+# convertida uma única vez na ingestão, e `author` é dictionary-encoded
+PARQUET_SCHEMA = pa.schema([
+    ('date', pa.string()),
+    ('time', pa.string()),
+    ('author', pa.dictionary(pa.int32(), pa.string())),
+    ('content', pa.string()),
+    ('timestamp', pa.timestamp('us')),
+])
+
+# Schema em disco: cada linha guarda o id da ingestão que a criou, para que
+# vetores e relatórios consigam separar as mensagens novas, e `msg_id`, a
+# posição sequencial da mensagem no chat (segue contando nas ingestões incrementais)
+STORAGE_SCHEMA = PARQUET_SCHEMA.append(pa.field('ingest_batch', pa.int32())).append(pa.field('msg_id', pa.int64()))
+
+# Schema do corpus multi-chat: `msg_id` conta por chat; `chat_id` e `month` viram diretórios de partição
+CORPUS_SCHEMA = (
+    PARQUET_SCHEMA.append(pa.field('msg_id', pa.int64()))
+    .append(pa.field('chat_id', pa.string())).append(pa.field('month', pa.string()))
+)
+
+def _normalize_times(times):
+    """Padroniza sufixos AM/PM ("p. m.", "pm", "PM") para o formato do strptime."""
+    return times.str.upper().str.replace(r'\s*([AP])\.?\s*M\.?$', r' \1M', regex=True)
+
+def detect_date_format(dates, times, portuguese=False):
+    """Detecta o formato de data/hora do export a partir de uma amostra.
+
+    DD/MM vs MM/DD é decidido pela primeira data com um componente > 12;
+    ano com 2 ou 4 dígitos, segundos (iOS) e AM/PM também são detectados.
+    Se nenhuma data desambigua (todos os dias <= 12), a ordem vem do locale:
+    só o relógio de 12h (AM/PM) de um export sem placeholders em português
+    (`portuguese`) indica MM/DD; relógio de 24h, com ou sem os segundos e
+    colchetes do iOS, fica com DD/MM.
+    Retorna (formato do strptime para "data hora", ambíguo).
+    """
+    times = _normalize_times(times)
+    ampm = times.str.endswith('M').any()
+    seconds = times.str.count(':').max() == 2
+
+    parts = dates.str.split('/', expand=True)
+    ambiguous = False
+    if parts[0].astype(int).max() > 12:
+        order = '%d/%m'
+    elif parts[1].astype(int).max() > 12:
+        order = '%m/%d'
+    else:
+        order = '%m/%d' if ampm and not portuguese else '%d/%m'
+        ambiguous = True
+    year = '%Y' if parts[2].str.len().max() == 4 else '%y'
+
+    time_fmt = ('%I' if ampm else '%H') + ':%M' + (':%S' if seconds else '') + (' %p' if ampm else '')
+    return f"{order}/{year} {time_fmt}", ambiguous
+
 class WhatsAppProcessor:
     def __init__(self):
-        # Matches date and time (with or without seconds), captures the rest after " - "
+        # Matches date and time (with or without seconds, optional AM/PM), captures the rest
+        # after " - " (Android) or "] " (iOS: "[31/12/23, 10:00:00] Author: msg").
         # Author and message are then split on the first ": " so any character (/, :, etc.)
         # in the author name is handled correctly.
         self.log_pattern = re.compile(
-            r'^(\d{1,2}/\d{1,2}/\d{2,4}),\s+(\d{1,2}:\d{2}(?::\d{2})?)\s+-\s+(.+)$'
+            r'^\[?(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AaPp]\.?\s?[Mm]\.?)?)'
+            r'(?:\]\s+|\s+-\s+)(.+)$'
         )
+        # Formato de data/hora do export (detectado uma vez, ver detect_date_format);
+        # `date_format_ambiguous` marca um palpite pelo locale
+        self.date_format = None
+        self.date_format_ambiguous = False
+        # Encoding efetivamente usado na última leitura (detectado durante a passada)
+        self.encoding = 'utf-8'
+        self.lines_read = 0
+        self.matches_found = 0
+        # Mensagens com placeholders em português (pista de locale para a data)
+        self.pt_markers = 0
+        # Arquivo de origem e offset (em bytes) até onde ele foi lido
+        self.source = None
+        self.offset = 0
+        # Anexos citados nas mensagens e arquivos de mídia presentes no .zip
+        self.media = []
+        self.media_count = 0
+        self.archive_members = {}
+        # Chat descompactado do último .zip lido: (origem, bytes, membros do .zip)
+        self._unzipped = None
 
-    def parse_file(self, file_path):
-        print(f"📂 Lendo arquivo: {file_path}")
+    @contextmanager
+    def _open_source(self, source):
+        """Abre o export em modo binário: caminho .txt/.zip, bytes ou arquivo em memória.
 
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except UnicodeDecodeError:
-            print("⚠️ Erro de encoding utf-8, tentando latin-1...")
-            with open(file_path, 'r', encoding='latin-1') as f:
-                lines = f.readlines()
+        Em um .zip, o `_chat.txt` (ou o único .txt) é descompactado uma única
+        vez, em memória (nada é extraído para o disco), e reaproveitado pelas
+        leituras seguintes do mesmo export (tamanho, hash do checkpoint, parse).
+        """
+        key = (str(source), os.stat(source).st_mtime_ns) if isinstance(source, (str, Path)) else source
+        if self._unzipped is not None and self._unzipped[0] == key:
+            self.archive_members = self._unzipped[2]
+            yield io.BytesIO(self._unzipped[1])
+            return
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        if hasattr(source, 'read'):
+            source.seek(0)
+            if not zipfile.is_zipfile(source):
+                source.seek(0)
+                yield source
+                return
+        elif not zipfile.is_zipfile(source):
+            with open(source, 'rb') as f:
+                yield f
+            return
 
-        data = []
+        with zipfile.ZipFile(source) as zf:
+            member = self._chat_member(zf)
+            self.archive_members = {
+                info.filename: info.file_size
+                for info in zf.infolist() if not info.is_dir() and info.filename != member
+            }
+            data = zf.read(member)
+        self._unzipped = (key, data, self.archive_members)
+        yield io.BytesIO(data)
+
+    @staticmethod
+    def _chat_member(zf):
+        texts = [n for n in zf.namelist() if n.lower().endswith('.txt')]
+        if not texts:
+            raise ValueError("Nenhum arquivo .txt de conversa encontrado no .zip")
+        chats = [n for n in texts if Path(n).name == '_chat.txt']
+        return (chats or texts)[0]
+
+    def _source_name(self, source):
+        return str(source) if isinstance(source, (str, Path)) else '<upload>'
+
+    def _source_size(self, source):
+        with self._open_source(source) as f:
+            return f.seek(0, io.SEEK_END)
+
+    def _tail_hash(self, source, offset):
+        with self._open_source(source) as f:
+            return tail_hash(f, offset)
+
+    def _iter_lines(self, file_path, start=0, end=None, encoding='utf-8'):
+        """Lê o arquivo uma única vez, decodificando linha a linha.
+
+        Começa em UTF-8 e, na primeira linha inválida, passa a usar latin-1
+        dali em diante — sem reler o arquivo do início. `start`/`end` limitam
+        a leitura a um intervalo de bytes (usado pela ingestão paralela).
+        """
+        self.encoding = encoding
+        self.source = file_path
+        self.offset = start
+        with self._open_source(file_path) as f:
+            f.seek(start)
+            pos = start
+            for raw in f:
+                if end is not None and pos >= end: break
+                pos += len(raw)
+                self.offset = pos
+                if self.encoding == 'utf-8':
+                    try:
+                        yield raw.decode('utf-8')
+                        continue
+                    except UnicodeDecodeError:
+                        print("⚠️ Erro de encoding utf-8, continuando em latin-1...")
+                        self.encoding = 'latin-1'
+                yield raw.decode('latin-1')
+
+    @staticmethod
+    def _clean_line(line):
+        # Remove caracteres de controle estranhos do WhatsApp e espaços especiais (iOS)
+        line = line.strip().replace('\u200e', '').replace('\u200f', '')
+        return line.replace('\u202f', ' ').replace('\xa0', ' ')
+
+    def _is_message_header(self, line):
+        """True se a linha abre uma mensagem com autor (não é log de sistema)."""
+        line = self._clean_line(line)
+        match = self.log_pattern.match(line)
+        return bool(match) and ': ' in match.group(3)
+
+    def _parse_lines(self, lines):
+        """Gera mensagens (dicts) a partir de um iterável de linhas de texto."""
         buffer_date = ""
         buffer_time = ""
         buffer_author = ""
         buffer_message = []
 
-        matches_found = 0
+        self.lines_read = 0
+        self.matches_found = 0
+        self.pt_markers = 0
+        self.media = []
+        self.media_count = 0
 
         for line in lines:
-            line = line.strip()
-            # Remove caracteres de controle estranhos do WhatsApp
-            line = line.replace('\u200e', '').replace('\u200f', '')
+            self.lines_read += 1
+            line = self._clean_line(line)
 
             if not line: continue
 
@@ -49,16 +248,23 @@ class WhatsAppProcessor:
 
                 author, msg_content = rest.split(': ', 1)
 
-                matches_found += 1
+                self.matches_found += 1
+                attachment = ATTACHMENT_PATTERN.search(msg_content)
+                if attachment:
+                    self._add_attachment(attachment, date, time_val, author)
+                elif any(x in msg_content for x in MEDIA_MARKERS):
+                    self.media_count += 1
+                if any(x in msg_content for x in PT_MARKERS):
+                    self.pt_markers += 1
                 if buffer_author:
                     full_msg = " ".join(buffer_message)
-                    if not any(x in full_msg for x in ["<Media omitted>", "<Mídia omitida>", "null"]):
-                        data.append({
+                    if not any(x in full_msg for x in SKIP_MARKERS):
+                        yield {
                             'date': buffer_date,
                             'time': buffer_time,
                             'author': buffer_author,
                             'content': full_msg
-                        })
+                        }
 
                 buffer_date, buffer_time, buffer_author = date, time_val, author
                 buffer_message = [msg_content]
@@ -66,44 +272,417 @@ class WhatsAppProcessor:
             else:
                 if buffer_author:
                     buffer_message.append(line)
+                    # Vários anexos enviados juntos: um por linha, na mesma mensagem
+                    attachment = ATTACHMENT_PATTERN.search(line)
+                    if attachment:
+                        self._add_attachment(attachment, buffer_date, buffer_time, buffer_author)
 
         if buffer_author and buffer_message:
             full_msg = " ".join(buffer_message)
-            if not any(x in full_msg for x in ["<Media omitted>", "<Mídia omitida>"]):
-                data.append({
+            if not any(x in full_msg for x in SKIP_MARKERS):
+                yield {
                     'date': buffer_date,
                     'time': buffer_time,
                     'author': buffer_author,
                     'content': full_msg
-                })
+                }
+
+    def _add_attachment(self, attachment, date, time_val, author):
+        self.media_count += 1
+        self.media.append({
+            'file': (attachment.group(1) or attachment.group(2)).strip(),
+            'date': date, 'time': time_val, 'author': author,
+        })
+
+    def iter_messages(self, file_path):
+        """Modo streaming: gera as mensagens conforme o arquivo é lido."""
+        return self._parse_lines(self._iter_lines(file_path))
 
-        print(f"📊 Diagnóstico: {len(lines)} linhas lidas, {matches_found} padrões encontrados.")
-        
-        df = pd.DataFrame(data)
+    def iter_batches(self, file_path, batch_size=STREAM_BATCH_SIZE, start=0, encoding='utf-8'):
+        """Agrupa as mensagens em pyarrow.RecordBatch de tamanho fixo.
+
+        O formato de data vale para o arquivo inteiro: enquanto nenhuma data
+        desambiguar dia e mês, os lotes ficam retidos, e todos saem com a
+        ordem da primeira data que desambiguar (ou, no fim do arquivo, com o
+        palpite pelo locale). Um formato já conhecido (checkpoint) é reaproveitado.
+        """
+        if start == 0:
+            self.date_format = None
+            self.date_format_ambiguous = False
+        pending = []
+        batch = []
+        for record in self._parse_lines(self._iter_lines(file_path, start, encoding=encoding)):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                pending.append(batch)
+                batch = []
+                if self.date_format is None:
+                    sample = pd.DataFrame(pending[-1], columns=MESSAGE_COLUMNS)
+                    if detect_date_format(sample['date'], sample['time'])[1]:
+                        continue
+                    self._detect_date_format([r for b in pending for r in b])
+                for records in pending:
+                    yield self._to_batch(records)
+                pending = []
+        if batch:
+            pending.append(batch)
+        if pending and self.date_format is None:
+            self._detect_date_format([r for b in pending for r in b])
+        for records in pending:
+            yield self._to_batch(records)
+
+    def _detect_date_format(self, records):
+        df = pd.DataFrame(records, columns=MESSAGE_COLUMNS)
+        self.date_format, self.date_format_ambiguous = detect_date_format(
+            df['date'], df['time'], portuguese=self.pt_markers > 0
+        )
+        hint = " (sem data que desambigue; palpite pelo locale)" if self.date_format_ambiguous else ""
+        print(f"🗓️ Formato de data detectado: {self.date_format}{hint}")
+
+    def _to_batch(self, records):
+        return pa.RecordBatch.from_pandas(self._to_frame(records), schema=PARQUET_SCHEMA, preserve_index=False)
+
+    def _to_frame(self, records):
+        """Monta o DataFrame tipado: `timestamp` datetime64 e `author` categórico."""
+        df = pd.DataFrame(records, columns=MESSAGE_COLUMNS)
+        if df.empty:
+            df['timestamp'] = pd.Series(dtype='datetime64[us]')
+            df['author'] = df['author'].astype('category')
+            return df
+        if self.date_format is None:
+            self._detect_date_format(records)
+        df['timestamp'] = pd.to_datetime(
+            df['date'] + ' ' + _normalize_times(df['time']), format=self.date_format, errors='coerce'
+        )
+        df['author'] = df['author'].astype('category')
+        return df
+
+    def parse_file(self, file_path):
+        print(f"📂 Lendo arquivo: {self._source_name(file_path)}")
+
+        self.date_format = None
+        data = list(self.iter_messages(file_path))
+
+        print(f"📊 Diagnóstico: {self.lines_read} linhas lidas, {self.matches_found} padrões encontrados.")
+
+        df = self._to_frame(data)
         if len(df) > 0:
             print(f"✅ Sucesso: {len(df)} mensagens válidas extraídas.")
         else:
             print("❌ Erro: Nenhuma mensagem extraída. Verifique o Regex.")
-            
+
         return df
 
-    def save_processed(self, df, output_path):
-        if df.empty: return
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        df.to_parquet(output_path)
-        print(f"💾 Salvo em: {output_path}")
+    def _split_ranges(self, file_path, workers):
+        """Divide o arquivo em intervalos de bytes que começam em cabeçalhos de mensagem.
+
+        Cortar só antes de uma linha "data, hora - autor: ..." garante que
+        linhas de continuação (mensagens multi-linha) nunca fiquem separadas
+        da mensagem a que pertencem.
+        """
+        size = os.path.getsize(file_path)
+        workers = max(1, min(workers, size // MIN_CHUNK_BYTES))
+        boundaries = [0]
+        with open(file_path, 'rb') as f:
+            for k in range(1, workers):
+                target = size * k // workers
+                if target <= boundaries[-1]: continue
+                f.seek(target)
+                f.readline()  # descarta a linha parcial
+                pos = f.tell()
+                for raw in f:
+                    if self._is_message_header(raw.decode('utf-8', errors='replace')):
+                        break
+                    pos += len(raw)
+                if pos >= size: break
+                if pos > boundaries[-1]:
+                    boundaries.append(pos)
+        boundaries.append(size)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def parse_file_parallel(self, file_path, workers=None):
+        """Mesma saída de `parse_file`, com o regex distribuído em vários processos."""
+        if not isinstance(file_path, (str, Path)) or zipfile.is_zipfile(file_path):
+            # Intervalos de bytes só fazem sentido em um .txt no disco
+            return self.parse_file(file_path)
+
+        workers = workers or os.cpu_count() or 1
+        print(f"📂 Lendo arquivo: {file_path}")
+
+        ranges = self._split_ranges(file_path, workers)
+        print(f"⚙️ Ingestão paralela: {len(ranges)} pedaço(s) em até {workers} processo(s)")
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            results = list(pool.map(
+                _parse_range, [(file_path, start, end, 'utf-8') for start, end in ranges]
+            ))
+
+        data = []
+        self.date_format = None
+        self.encoding = 'utf-8'
+        self.source = file_path
+        self.offset = ranges[-1][1] if ranges else 0
+        self.lines_read = 0
+        self.matches_found = 0
+        self.pt_markers = 0
+        self.media = []
+        self.media_count = 0
+        for (start, end), result in zip(ranges, results):
+            # O modo serial troca para latin-1 na primeira linha inválida e segue
+            # assim até o fim; todo pedaço depois da troca é refeito em latin-1
+            # (mesmo um que também trocou, mas só no meio).
+            if self.encoding != 'utf-8':
+                result = _parse_range((file_path, start, end, self.encoding))
+            records, self.encoding, lines_read, matches_found, pt_markers, media, media_count = result
+            data.extend(records)
+            self.lines_read += lines_read
+            self.matches_found += matches_found
+            self.pt_markers += pt_markers
+            self.media.extend(media)
+            self.media_count += media_count
+
+        print(f"📊 Diagnóstico: {self.lines_read} linhas lidas, {self.matches_found} padrões encontrados.")
+
+        df = self._to_frame(data)
+        if len(df) > 0:
+            print(f"✅ Sucesso: {len(df)} mensagens válidas extraídas.")
+        else:
+            print("❌ Erro: Nenhuma mensagem extraída. Verifique o Regex.")
+
+        return df
+
+    def ingest_incremental(self, file_path, output_path, batch_size=STREAM_BATCH_SIZE):
+        """Processa só o que foi acrescentado ao export desde a última ingestão.
+
+        Se o novo arquivo começa com o mesmo conteúdo já processado (conferido
+        pelo checkpoint), lê a partir do offset salvo e acrescenta as mensagens
+        novas numa parte nova do dataset. Caso contrário, reprocessa tudo.
+        """
+        offset = resume_offset(
+            output_path, STORAGE_SCHEMA, self._source_size(file_path),
+            lambda at: self._tail_hash(file_path, at),
+        )
+        if offset is None:
+            print("🔁 Sem checkpoint compatível: reprocessando o arquivo inteiro.")
+            return self.save_processed(self.iter_batches(file_path, batch_size), output_path)
+
+        checkpoint = load_checkpoint(output_path)
+        if checkpoint.get('date_format') is None or checkpoint.get('date_format_ambiguous'):
+            # As partes gravadas usam um palpite de dia/mês que as mensagens novas
+            # podem contradizer: reprocessar tudo mantém uma única ordem no dataset
+            print("🔁 Ordem dia/mês da última ingestão era um palpite: reprocessando o arquivo inteiro.")
+            return self.save_processed(self.iter_batches(file_path, batch_size), output_path)
+        encoding = checkpoint.get('encoding', 'utf-8')
+        # Mantém o formato de data das partes já gravadas
+        self.date_format = checkpoint['date_format']
+        self.date_format_ambiguous = False
+        print(f"⏩ Checkpoint encontrado: lendo a partir do byte {offset}.")
+        batches = self.iter_batches(file_path, batch_size, start=offset, encoding=encoding)
+        return self.save_processed(batches, output_path, append=True)
+
+    def save_processed(self, df, output_path, append=False):
+        """Salva um DataFrame ou um iterável de RecordBatch no dataset Parquet.
+
+        `output_path` é um diretório com um arquivo por ingestão
+        (`part-<ingest_batch>.parquet`, ver `part_path`). Com batches (ver
+        `iter_batches`), cada lote vira um row group escrito incrementalmente
+        pelo ParquetWriter, sem materializar o chat inteiro. Com `append`, as
+        partes existentes ficam intactas e as mensagens novas entram numa
+        parte nova; sem ele, o diretório inteiro é substituído. Em seguida
+        grava o checkpoint usado pela ingestão incremental. Retorna o número
+        de mensagens novas salvas.
+        """
+        previous = load_checkpoint(output_path)
+        ingest_batch = previous['ingest_batch'] + 1 if previous else 0
+        next_id = previous['rows'] if append and previous else 0
+
+        streaming = not isinstance(df, pd.DataFrame)
+        if not streaming:
+            df = [pa.Table.from_pandas(df, schema=PARQUET_SCHEMA, preserve_index=False)]
+
+        output_path = Path(output_path)
+        # Um reprocessamento completo monta o diretório novo ao lado e troca no fim
+        target_dir = output_path if append else Path(f"{output_path}.tmp")
+        if not append and target_dir.exists():
+            shutil.rmtree(target_dir)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        # Prefixo "_": o pyarrow ignora o arquivo enquanto ele é escrito
+        tmp_path = target_dir / f"_{part_path(target_dir, ingest_batch).name}.tmp"
+        # Índice de mensagens indexado lote a lote, junto com a escrita; num append,
+        # só as mensagens novas viram um segmento (se o índice estiver em dia)
+        index = MessageIndexWriter(target_dir, append=append)
+        if index.docs != next_id:
+            index = None
+        total = 0
+        last = None
+        with pq.ParquetWriter(tmp_path, STORAGE_SCHEMA) as writer:
+            for batch in df:
+                if batch.num_rows == 0: continue
+                table = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+                table = table.append_column(
+                    'ingest_batch', pa.array([ingest_batch] * table.num_rows, pa.int32())
+                ).append_column('msg_id', pa.array(range(next_id + total, next_id + total + table.num_rows), pa.int64()))
+                writer.write_table(table)
+                if index is not None:
+                    index.add(table.to_pandas())
+                total += table.num_rows
+                last = table.slice(table.num_rows - 1).to_pylist()[0]
+
+        if streaming:
+            print(f"📊 Diagnóstico: {self.lines_read} linhas lidas, {self.matches_found} padrões encontrados.")
+
+        if total == 0:
+            tmp_path.unlink()
+            if not append:
+                shutil.rmtree(target_dir)
+                print("❌ Erro: Nenhuma mensagem extraída. Verifique o Regex.")
+                return 0
+            print("✅ Nenhuma mensagem nova desde a última ingestão.")
+        else:
+            tmp_path.replace(part_path(target_dir, ingest_batch))
+            if index is not None:
+                index.commit()
+            if not append:
+                _replace_dir(target_dir, output_path)
+            print(f"💾 Salvo em: {part_path(output_path, ingest_batch)} ({total} mensagens novas)")
+            if index is None:
+                print("🔁 Índice de mensagens ausente ou defasado: reconstruindo.")
+                build_message_index(output_path)
+
+        if self.media or self.archive_members:
+            save_media_index(output_path, self.media_index(), append=append)
+
+        if self.source is not None:
+            save_checkpoint(output_path, {
+                'source': self._source_name(self.source),
+                'byte_offset': self.offset,
+                'tail_hash': self._tail_hash(self.source, self.offset),
+                'encoding': self.encoding,
+                'date_format': self.date_format,
+                'date_format_ambiguous': self.date_format_ambiguous,
+                'last_timestamp': str(last['timestamp']) if last and last['timestamp'] else (previous or {}).get('last_timestamp'),
+                'rows': (previous['rows'] if append else 0) + total,
+                'last_batch_rows': total,
+                'ingest_batch': ingest_batch,
+            })
+        return total
+
+    def media_index(self):
+        """Anexos da última leitura, com o tamanho do arquivo quando ele veio no .zip.
+
+        Arquivos do .zip que nenhuma mensagem cita também entram (sem autor/data).
+        """
+        entries = []
+        cited = set()
+        for item in self.media:
+            cited.add(item['file'])
+            entries.append({**item, 'size': self.archive_members.get(item['file'])})
+        for name, size in self.archive_members.items():
+            if Path(name).name not in cited and name not in cited:
+                entries.append({'file': name, 'date': None, 'time': None, 'author': None, 'size': size})
+        return entries
+
+def _replace_dir(src, dst):
+    """Troca `dst` (diretório ou Parquet único do formato antigo) por `src`."""
+    old = Path(f"{dst}.old")
+    if old.exists():
+        shutil.rmtree(old) if old.is_dir() else old.unlink()
+    if dst.exists():
+        dst.rename(old)
+    src.rename(dst)
+    if old.exists():
+        shutil.rmtree(old) if old.is_dir() else old.unlink()
+
+def chat_id_from_path(file_path):
+    """Identificador estável do chat a partir do nome do export.
+
+    "WhatsApp Chat with Família.txt" -> "família"; para exports iOS
+    ("<pasta>/_chat.txt") usa o nome da pasta.
+    """
+    path = Path(file_path)
+    name = path.parent.name if path.stem.startswith('_chat') else path.stem
+    name = re.sub(r'^(WhatsApp Chat (with|-)|Conversa do WhatsApp com)\s*', '', name, flags=re.IGNORECASE)
+    return re.sub(r'[^\w-]+', '_', name).strip('_').lower() or 'chat'
+
+def find_exports(input_dir):
+    """Lista os exports .txt/.zip dentro de um diretório (recursivo)."""
+    return sorted(
+        p for p in Path(input_dir).rglob('*')
+        if p.is_file() and p.suffix.lower() in ('.txt', '.zip')
+    )
+
+def ingest_corpus(input_dir, output_dir=CORPUS_DIR, workers=None):
+    """Ingere vários exports em paralelo num dataset Hive particionado.
+
+    Cada chat vira `chat_id=<id>/month=<AAAA-MM>/*.parquet`; reingerir um
+    chat substitui apenas o diretório dele. Retorna {chat_id: mensagens}.
+    """
+    exports = find_exports(input_dir)
+    if not exports:
+        print(f"❌ Nenhum export .txt/.zip encontrado em: {input_dir}")
+        return {}
+
+    jobs = [(str(path), chat_id_from_path(path), str(output_dir)) for path in exports]
+    chat_ids = [job[1] for job in jobs]
+    duplicated = {c for c in chat_ids if chat_ids.count(c) > 1}
+    if duplicated:
+        raise ValueError(f"chat_id repetido para exports diferentes: {sorted(duplicated)}")
+
+    print(f"📚 Corpus: {len(jobs)} export(s) em {input_dir}")
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        results = dict(pool.map(_ingest_export, jobs))
+
+    print(f"💾 Corpus salvo em: {output_dir} ({sum(results.values())} mensagens, {len(results)} chats)")
+    # Um chat por vez: a memória fica no tamanho do maior chat, como nos workers
+    build_message_index(output_dir)
+    return results
+
+def _ingest_export(args):
+    """Worker do ProcessPoolExecutor: parseia um export e grava suas partições."""
+    file_path, chat_id, output_dir = args
+    proc = WhatsAppProcessor()
+    df = proc.parse_file(file_path)
+
+    chat_dir = Path(output_dir) / f"chat_id={chat_id}"
+    if chat_dir.exists():
+        shutil.rmtree(chat_dir)
+    if df.empty:
+        return chat_id, 0
+    chat_dir.mkdir(parents=True)
+    if proc.media or proc.archive_members:
+        save_media_index(chat_dir, proc.media_index())
+
+    df['msg_id'] = range(len(df))
+    df['chat_id'] = chat_id
+    df['month'] = df['timestamp'].dt.strftime('%Y-%m').fillna('unknown')
+    table = pa.Table.from_pandas(
+        df, schema=CORPUS_SCHEMA, preserve_index=False
+    )
+    pq.write_to_dataset(
+        table, output_dir, partition_cols=['chat_id', 'month'],
+        basename_template=f"{chat_id}-{{i}}.parquet",
+    )
+    return chat_id, len(df)
+
+def _parse_range(args):
+    """Worker do ProcessPoolExecutor: parseia um intervalo de bytes do arquivo."""
+    file_path, start, end, encoding = args
+    proc = WhatsAppProcessor()
+    records = list(proc._parse_lines(proc._iter_lines(file_path, start, end, encoding)))
+    return records, proc.encoding, proc.lines_read, proc.matches_found, proc.pt_markers, proc.media, proc.media_count
 
 if __name__ == "__main__":
     input_file = sys.argv[1] if len(sys.argv) > 1 else "data/raw/_chat.txt"
     output_file = "data/processed/chat_history.parquet"
-    
+
     if not Path(input_file).exists():
         print(f"❌ Arquivo não encontrado: {input_file}")
         sys.exit(1)
 
     processor = WhatsAppProcessor()
     df = processor.parse_file(input_file)
-    
+
     if not df.empty:
         processor.save_processed(df, output_file)
         print("\n🔍 Amostra dos dados:")
@@ -1,11 +1,17 @@
+import asyncio
+import json
 import sys
 import os
+import time
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import httpx
 import ollama
 from termcolor import colored
 
@@ -13,7 +19,8 @@ from termcolor import colored
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 # Importa o motor da Sprint 3
-from src.llm.chat_engine import WhatsAppChat, OLLAMA_MODEL
+from src.llm.chat_engine import CONTEXT_TOKEN_BUDGET, WhatsAppChat, OLLAMA_MODEL
+from src.interface.scheduler import GENERATION_TIMEOUT, GenerationScheduler, QueueFull
 
 app = FastAPI(
     title="WhatsApp AI Analyzer API",
@@ -33,25 +40,58 @@ app.add_middleware(
 REPORTS_DIR = Path("data/reports")
 app.mount("/reports", StaticFiles(directory=REPORTS_DIR), name="reports")
 
+# --- CONFIGURAÇÃO ---
+# Conexões HTTP abertas com o Ollama (uma por resposta em streaming simultânea)
+LLM_MAX_CONNECTIONS = 64
+# Sem limite de leitura: o R1 pode "pensar" por minutos antes do primeiro token
+LLM_TIMEOUT = httpx.Timeout(connect=10.0, read=None, write=30.0, pool=30.0)
+# Sugestão de espera enviada no Retry-After dos 429, em segundos
+RETRY_AFTER = 10
+
 # --- ESTADO GLOBAL ---
 # Carregamos o Chat Engine uma única vez na inicialização
 print(colored("⏳ Inicializando Motor de IA para a API...", "yellow"))
 chat_engine = None
+# Cliente assíncrono do Ollama (httpx com pool de conexões; host em OLLAMA_HOST)
+llm_client = None
+# Admissão das gerações: o Ollama local atende poucas respostas por vez
+scheduler = GenerationScheduler()
 
 @app.on_event("startup")
 async def startup_event():
-    global chat_engine
+    global chat_engine, llm_client
+    llm_client = ollama.AsyncClient(
+        timeout=LLM_TIMEOUT,
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+    )
     try:
-        # Inicializa conexão com Qdrant e Modelo de Embedding
-        chat_engine = WhatsAppChat()
+        # Inicializa conexão com Qdrant e Modelo de Embedding (fora do event loop)
+        chat_engine = await run_in_threadpool(WhatsAppChat)
         print(colored("✅ API Pronta e Conectada à GPU!", "green"))
     except Exception as e:
         print(colored(f"❌ Falha crítica ao iniciar motor: {e}", "red"))
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if llm_client:
+        await llm_client.close()
+
 # --- MODELOS DE DADOS ---
 class ChatRequest(BaseModel):
     message: str
     limit: int = 15
+    # Filtros da busca (datas AAAA-MM-DD); com parse_filters, o que faltar é tirado da pergunta
+    authors: list[str] | None = None
+    chat_ids: list[str] | None = None
+    start: str | None = None
+    end: str | None = None
+    parse_filters: bool = False
+    # Teto de tokens do contexto recuperado no prompt
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    # Linhas "[fila] posição N" no início do stream enquanto espera a vez
+    queue_feedback: bool = True
+    # Reaproveita (e grava) a resposta de uma pergunta parecida com os mesmos dados e parâmetros
+    answer_cache: bool = True
 
 # --- ENDPOINTS ---
 
@@ -60,20 +100,56 @@ async def root():
     return {
         "status": "online",
         "gpu": "AMD Radeon RX 6600 XT",
-        "endpoints": ["/v1/chat", "/v1/reports/{filename}"]
+        "endpoints": ["/v1/chat", "/v1/cache", "/v1/queue", "/v1/reports/{filename}"]
     }
 
+def lookup_answer(req):
+    """Filtros da pergunta, chave do cache de respostas e a resposta em cache (ou None)."""
+    filters = chat_engine.query_filters(
+        req.message if req.parse_filters else None,
+        authors=req.authors, chat_ids=req.chat_ids, start=req.start, end=req.end,
+    )
+    # Mesmo prompt, filtros e tamanho de contexto: senão a resposta poderia ser outra
+    scope = json.dumps({'prompt': 'api', 'filters': filters, 'limit': req.limit, 'token_budget': req.token_budget}, sort_keys=True)
+    key = chat_engine.answer_key(req.message, OLLAMA_MODEL, scope)
+    return filters, key, chat_engine.answers.get(key) if req.answer_cache else None
+
 @app.post("/v1/chat")
-async def chat_endpoint(req: ChatRequest):
+async def chat_endpoint(req: ChatRequest, request: Request):
     """
     Recebe uma pergunta, busca contexto no Qdrant e gera resposta via DeepSeek.
-    Retorna streaming de texto.
+    Retorna streaming de texto. Com o Ollama ocupado o pedido espera numa
+    fila (posição no início do stream); fila cheia ou cota do cliente
+    esgotada dão 429.
     """
     if not chat_engine:
         raise HTTPException(status_code=503, detail="Motor de IA não inicializado")
 
-    # 1. Recuperação (RAG)
-    context = chat_engine.get_context(req.message, limit=req.limit)
+    # 0. Cache de respostas: uma pergunta parecida já respondida não ocupa o LLM nem a fila
+    filters, answer_key, cached = await run_in_threadpool(lookup_answer, req)
+    if cached:
+        async def replay():
+            for chunk in cached[0]:
+                yield chunk
+
+        headers = {"X-Answer-Cache": "hit", "X-Answer-Similarity": f"{cached[1]:.3f}"}
+        return StreamingResponse(replay(), media_type="text/plain", headers=headers)
+
+    # Admissão: cliente identificado pelo header X-Client-Id ou pelo IP
+    client_id = request.headers.get("X-Client-Id") or (request.client.host if request.client else "anon")
+    try:
+        ticket = scheduler.submit(client_id)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER)})
+
+    # 1. Recuperação (RAG): encoder e índices são síncronos, então rodam no threadpool
+    try:
+        context, packing = await run_in_threadpool(
+            chat_engine.build_context, req.message, req.limit, filters, token_budget=req.token_budget,
+        )
+    except BaseException:  # inclusive cancelamento do pedido
+        scheduler.release(ticket)
+        raise
     
     # 2. Construção do Prompt
     system_prompt = f"""
@@ -85,21 +161,70 @@ async def chat_endpoint(req: ChatRequest):
     {context}
     """
 
-    # 3. Gerador para Streaming
+    # 3. Gerador para Streaming: cada token é um await, o event loop segue atendendo os outros clientes
     async def generate():
-        stream = ollama.chat(
-            model=OLLAMA_MODEL,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': req.message},
-            ],
-            stream=True,
-        )
-        
-        for chunk in stream:
-            yield chunk['message']['content']
+        # A vaga é liberada em qualquer saída: fim, erro, timeout ou cliente desconectado
+        # (se o gerador nem chegar a começar, quem libera é a background task da resposta)
+        try:
+            try:
+                async for position in scheduler.wait(ticket):
+                    if req.queue_feedback:
+                        yield f"[fila] posição {position}\n"
+            except TimeoutError as e:
+                yield f"[fila] {e}\n"
+                return
+
+            deadline = time.monotonic() + GENERATION_TIMEOUT
+            stream = await llm_client.chat(
+                model=OLLAMA_MODEL,
+                messages=[
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': req.message},
+                ],
+                stream=True,
+            )
+            chunks = []
+            try:
+                while True:
+                    chunk = await asyncio.wait_for(anext(stream), deadline - time.monotonic())
+                    chunks.append(chunk['message']['content'])
+                    yield chunks[-1]
+            except StopAsyncIteration:
+                # Só respostas completas entram no cache
+                if req.answer_cache:
+                    await run_in_threadpool(chat_engine.answers.put, answer_key, chunks)
+            except asyncio.TimeoutError:
+                yield f"\n[erro] Geração interrompida após {GENERATION_TIMEOUT}s"
+            finally:
+                await stream.aclose()
+        finally:
+            scheduler.release(ticket)
+
+    # Tamanho do contexto nos headers: o corpo já é a resposta em streaming
+    headers = {
+        "X-Context-Tokens": str(packing['tokens']),
+        "X-Context-Tokens-Saved": str(packing['tokens_saved']),
+        "X-Context-Duplicates": str(packing['duplicates']),
+        "X-Context-Route": packing.get('route', 'retrieval'),
+        "X-Answer-Cache": "miss",
+    }
+    async def release():
+        # Async: roda no event loop, como o resto do scheduler (release é idempotente)
+        scheduler.release(ticket)
+
+    return StreamingResponse(generate(), media_type="text/plain", headers=headers, background=BackgroundTask(release))
+
+@app.get("/v1/cache")
+async def cache_stats():
+    """Acertos e erros dos caches de consulta (vetor da pergunta, resultados e respostas)"""
+    if not chat_engine:
+        raise HTTPException(status_code=503, detail="Motor de IA não inicializado")
+    return chat_engine.cache_stats()
 
-    return StreamingResponse(generate(), media_type="text/plain")
+@app.get("/v1/queue")
+async def queue_stats():
+    """Fila de geração: pedidos gerando e esperando, tempos de espera e recusas (429)"""
+    return scheduler.stats()
 
 @app.get("/v1/gallery")
 async def list_reports():
@@ -42,11 +42,12 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "chat_engine" not in st.session_state:
     st.session_state.chat_engine = None
+if "raw_stats" not in st.session_state:
+    st.session_state.raw_stats = {'total': 0, 'media': 0}
 
 DATA_RAW = Path("data/raw")
 DATA_PROCESSED = Path("data/processed")
 REPORTS_DIR = Path("data/reports")
-INTERNAL_CHAT_PATH = DATA_RAW / "current_chat_import.txt" 
 PARQUET_PATH = DATA_PROCESSED / "chat_history.parquet"
 
 # --- MONITORAMENTO ---
@@ -63,7 +64,7 @@ def get_hw_metrics():
     return metrics
 
 # --- PIPELINE ---
-def run_pipeline(hw_placeholder):
+def run_pipeline(hw_placeholder, upload):
     status = st.status("🚀 Iniciando Motor...", expanded=True)
     log_area = status.empty()
     logs = []
@@ -84,12 +85,13 @@ def run_pipeline(hw_placeholder):
             c2.metric("RAM", f"{hw['ram']}%")
 
     try:
-        # 1. Ingestão
+        # 1. Ingestão (direto dos bytes do upload; .zip é lido sem extrair)
         log("📂 [1/5] Lendo arquivo...")
         proc = WhatsAppProcessor()
         with redirect_stdout(io.StringIO()):
-            df = proc.parse_file(str(INTERNAL_CHAT_PATH))
+            df = proc.parse_file(upload)
             proc.save_processed(df, str(PARQUET_PATH))
+        st.session_state.raw_stats = {'total': proc.lines_read, 'media': proc.media_count}
         
         if df.empty:
             status.update(label="❌ Erro: Arquivo inválido", state="error")
@@ -147,18 +149,13 @@ def reset_session():
         torch.cuda.empty_cache()
     gc.collect()
 
-def get_stats(raw, df):
-    stats = {'total': 0, 'media': 0, 'valid': len(df), 'period': '-'}
-    if os.path.exists(raw):
-        with open(raw, 'r', errors='ignore') as f:
-            for l in f:
-                stats['total'] += 1
-                if "omitida" in l or "omitted" in l: stats['media'] += 1
+def get_stats(raw_stats, df):
+    # Linhas e mídias já foram contadas pelo processador durante a ingestão
+    stats = {'total': raw_stats['total'], 'media': raw_stats['media'], 'valid': len(df), 'period': '-'}
     
-    if 'date' in df.columns and not df.empty:
-        df['dt'] = pd.to_datetime(df['date'], format='%m/%d/%y', errors='coerce')
-        if not df['dt'].isnull().all():
-            stats['period'] = df['dt'].dt.strftime('%m/%Y').value_counts().idxmax()
+    if 'timestamp' in df.columns and not df.empty:
+        if not df['timestamp'].isnull().all():
+            stats['period'] = df['timestamp'].dt.strftime('%m/%Y').value_counts().idxmax()
     return stats, df['author'].unique().tolist() if not df.empty else []
 
 def get_models():
@@ -190,20 +187,18 @@ with st.sidebar:
     st.divider()
     model = st.selectbox("Modelo IA", get_models())
     
-    uploaded = st.file_uploader("Arquivo .txt", type="txt")
+    uploaded = st.file_uploader("Arquivo .txt ou .zip", type=["txt", "zip"])
     if uploaded:
         if st.button("🔄 Iniciar Análise", type="primary", use_container_width=True):
             reset_session()
-            with open(INTERNAL_CHAT_PATH, "wb") as f:
-                f.write(uploaded.getbuffer())
             st.session_state.is_processing = True
-            run_pipeline(hw_placeholder) # Passa o placeholder pra atualizar live
+            run_pipeline(hw_placeholder, uploaded.getvalue()) # Passa o placeholder pra atualizar live
             st.session_state.is_processing = False
 
 # Main
 if st.session_state.processing_complete:
     df = pd.read_parquet(PARQUET_PATH)
-    stats, participants = get_stats(INTERNAL_CHAT_PATH, df)
+    stats, participants = get_stats(st.session_state.raw_stats, df)
     
     tab1, tab2 = st.tabs(["📊 Dashboard", "💬 Chat"])
     
@@ -243,16 +238,25 @@ if st.session_state.processing_complete:
                     status = st.empty()
                     resp = st.empty()
                     
-                    ctx = st.session_state.chat_engine.get_context(prompt)
-                    sys_p = f"Analista de WhatsApp.\nParticipantes: {', '.join(participants)}\nContexto: {ctx}"
+                    engine = st.session_state.chat_engine
+                    # Pergunta parecida já respondida com os mesmos dados: reproduz o stream gravado
+                    answer_key = engine.answer_key(prompt, model, scope="app")
+                    cached = engine.answers.get(answer_key)
                     
                     try:
-                        stream = ollama.chat(model=model, messages=[{'role':'system','content':sys_p}, {'role':'user','content':prompt}], stream=True)
+                        if cached:
+                            stream = ({'message': {'content': c}} for c in cached[0])
+                        else:
+                            ctx = engine.get_context(prompt)
+                            sys_p = f"Analista de WhatsApp.\nParticipantes: {', '.join(participants)}\nContexto: {ctx}"
+                            stream = ollama.chat(model=model, messages=[{'role':'system','content':sys_p}, {'role':'user','content':prompt}], stream=True)
                         full, buf, thinking = "", "", False
                         expander = status.status("🧠...", expanded=False)
+                        chunks = []
                         
                         for chunk in stream:
                             txt = chunk['message']['content']
+                            chunks.append(txt)
                             if "<think>" in txt: thinking=True; txt=txt.replace("<think>",""); expander.update(expanded=True)
                             if "</think>" in txt: thinking=False; txt=txt.replace("</think>",""); expander.update(label="💡 Ok", state="complete", expanded=False)
                             
@@ -261,6 +265,8 @@ if st.session_state.processing_complete:
                         
                         resp.markdown(full)
                         st.session_state.messages.append({"role": "assistant", "content": full})
+                        if not cached:
+                            engine.answers.put(answer_key, chunks)
                     except Exception as e: st.error(f"Erro: {e}")
 
 else:
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+
+# Configurações
+# Gerações simultâneas enviadas ao Ollama (acompanhe o OLLAMA_NUM_PARALLEL do servidor)
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 2))
+# Pedidos esperando vaga; acima disso a API responde 429
+MAX_QUEUE = 32
+# Pedidos (na fila + gerando) de um mesmo cliente
+PER_CLIENT_LIMIT = 2
+# Espera máxima na fila e duração máxima de uma geração, em segundos
+QUEUE_TIMEOUT = 120
+GENERATION_TIMEOUT = 600
+# Intervalo entre as conferências da posição na fila
+POSITION_INTERVAL = 1.0
+# Esperas recentes guardadas para as métricas
+WAIT_SAMPLES = 1_000
+
+class QueueFull(Exception):
+    """Pedido recusado na admissão (fila cheia ou cota do cliente); vira 429 na API."""
+
+class Ticket:
+    def __init__(self, client_id, ready):
+        self.client_id = client_id
+        self.created = time.monotonic()
+        self.ready = ready
+
+class GenerationScheduler:
+    """Controle de admissão das gerações: limite de execuções, fila FIFO e cota por cliente.
+
+    Roda no event loop da API (sem threads), então não precisa de lock.
+    Cada pedido admitido recebe um `Ticket`; `wait` espera a vez informando
+    a posição na fila e `release` libera a vaga (sempre, mesmo em erro ou
+    desconexão do cliente).
+    """
+
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT, max_queue=MAX_QUEUE,
+                 per_client=PER_CLIENT_LIMIT, queue_timeout=QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_client = per_client
+        self.queue_timeout = queue_timeout
+        self.queue = deque()
+        self.running = set()
+        self.by_client = Counter()
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.counts = Counter()
+
+    def submit(self, client_id):
+        """Admite o pedido (rodando ou na fila) ou levanta `QueueFull`."""
+        if self.by_client[client_id] >= self.per_client:
+            self.counts['rejected'] += 1
+            raise QueueFull(f"Limite de {self.per_client} pedidos simultâneos por cliente")
+        if len(self.running) >= self.max_in_flight and len(self.queue) >= self.max_queue:
+            self.counts['rejected'] += 1
+            raise QueueFull(f"Fila cheia ({self.max_queue} pedidos esperando)")
+        ticket = Ticket(client_id, asyncio.get_running_loop().create_future())
+        self.by_client[client_id] += 1
+        self.counts['admitted'] += 1
+        self.queue.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        while self.queue and len(self.running) < self.max_in_flight:
+            ticket = self.queue.popleft()
+            self.running.add(ticket)
+            self.waits.append(time.monotonic() - ticket.created)
+            ticket.ready.set_result(None)
+
+    def position(self, ticket):
+        """Posição na fila (1 = próximo); 0 se já está gerando."""
+        return 0 if ticket.ready.done() else self.queue.index(ticket) + 1
+
+    async def wait(self, ticket):
+        """Espera a vez do pedido, gerando a posição na fila sempre que ela muda.
+
+        Levanta `TimeoutError` (e sai da fila) depois de `queue_timeout` segundos.
+        """
+        last = None
+        while not ticket.ready.done():
+            position = self.position(ticket)
+            if position != last:
+                last = position
+                yield position
+            remaining = self.queue_timeout - (time.monotonic() - ticket.created)
+            if remaining <= 0:
+                self.counts['timeouts'] += 1
+                self.release(ticket)
+                raise TimeoutError(f"Tempo de espera na fila esgotado ({self.queue_timeout}s)")
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.ready), min(POSITION_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, ticket):
+        """Libera a vaga (ou o lugar na fila) do pedido; chamar mais de uma vez não tem efeito."""
+        if ticket in self.running:
+            self.running.remove(ticket)
+            self.counts['completed'] += 1
+        elif ticket in self.queue:
+            self.queue.remove(ticket)
+            self.counts['abandoned'] += 1
+        else:
+            return
+        self.by_client[ticket.client_id] -= 1
+        if not self.by_client[ticket.client_id]:
+            del self.by_client[ticket.client_id]
+        self._dispatch()
+
+    def stats(self):
+        waits = sorted(self.waits)
+        percentile = lambda p: round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+        return {
+            'in_flight': len(self.running),
+            'queued': len(self.queue),
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'per_client_limit': self.per_client,
+            'clients': len(self.by_client),
+            'wait_p50': percentile(0.50),
+            'wait_p95': percentile(0.95),
+            'wait_max': round(waits[-1], 3) if waits else 0.0,
+            **{k: self.counts[k] for k in ('admitted', 'rejected', 'timeouts', 'completed', 'abandoned')},
+        }
@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+# Configurações
+ANSWER_CACHE_DIR = "./data/answer_cache"
+MAX_ANSWERS = 1_000
+# Cosseno mínimo entre as perguntas para reaproveitar a resposta
+ANSWER_SIMILARITY = 0.93
+# Respostas vencem mesmo sem reingestão ("semana passada" muda com o tempo), em segundos
+ANSWER_TTL = 86_400
+
+ANSWER_SCHEMA = pa.schema([
+    ('question', pa.string()),
+    ('vector', pa.list_(pa.float32())),
+    ('model', pa.string()),
+    ('version', pa.string()),
+    ('scope', pa.string()),
+    ('chunks', pa.list_(pa.string())),
+    ('created', pa.float64()),
+    ('last_used', pa.float64()),
+    ('hits', pa.int64()),
+])
+
+# Pergunta normalizada, vetor normalizado (None sem encoder: só pergunta idêntica),
+# modelo do Ollama, versão da coleção e escopo (prompt + filtros) de quem pergunta
+AnswerKey = namedtuple("AnswerKey", ["question", "vector", "model", "version", "scope"])
+
+class AnswerCache:
+    """Cache semântico de respostas do LLM, persistido em Parquet.
+
+    Uma pergunta parecida o bastante com outra já respondida (mesmo modelo,
+    mesma versão da coleção e mesmo escopo) devolve os chunks gravados do
+    stream, para reproduzir na hora. Entradas de versões antigas da coleção
+    saem no primeiro acesso depois da reingestão; acima de `max_items`, as
+    menos usadas recentemente. Streamlit, API e CLI compartilham o arquivo.
+    """
+
+    def __init__(self, name, cache_dir=ANSWER_CACHE_DIR, max_items=MAX_ANSWERS,
+                 threshold=ANSWER_SIMILARITY, ttl=ANSWER_TTL):
+        slug = re.sub(r'[^\w.-]+', '_', name)
+        self.path = Path(cache_dir) / f"{slug}.parquet"
+        self.max_items = max_items
+        self.threshold = threshold
+        self.ttl = ttl
+        self.entries = []
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def _locked(self):
+        """Lock entre threads e entre processos; relê o arquivo se outro processo gravou."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock, open(self.path.with_suffix(".lock"), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                mtime = self.path.stat().st_mtime_ns if self.path.exists() else None
+                if mtime != self.mtime:
+                    self.entries = pq.read_table(self.path).to_pylist() if mtime else []
+                    for entry in self.entries:
+                        if entry['vector'] is not None:
+                            entry['vector'] = np.asarray(entry['vector'], dtype=np.float32)
+                    self.mtime = mtime
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self):
+        rows = [{**e, 'vector': e['vector'].tolist() if e['vector'] is not None else None} for e in self.entries]
+        tmp_path = self.path.with_suffix(".parquet.tmp")
+        pq.write_table(pa.Table.from_pylist(rows, schema=ANSWER_SCHEMA), tmp_path)
+        os.replace(tmp_path, self.path)
+        self.mtime = self.path.stat().st_mtime_ns
+
+    def _purge(self, version, now):
+        """Tira respostas de outra versão da coleção (reingestão) ou vencidas; True se mudou algo."""
+        kept = [e for e in self.entries if e['version'] == version and now - e['created'] <= self.ttl]
+        changed = len(kept) != len(self.entries)
+        self.entries = kept
+        return changed
+
+    def get(self, key):
+        """(chunks, similaridade) da resposta mais parecida acima do limiar, ou None."""
+        now = time.time()
+        with self._locked():
+            changed = self._purge(key.version, now)
+            best, best_sim = None, 0.0
+            for entry in self.entries:
+                if entry['model'] != key.model or entry['scope'] != key.scope:
+                    continue
+                if key.vector is not None and entry['vector'] is not None:
+                    sim = float(entry['vector'] @ key.vector)
+                else:
+                    sim = 1.0 if entry['question'] == key.question else 0.0
+                if sim > best_sim:
+                    best, best_sim = entry, sim
+            if best is None or best_sim < self.threshold:
+                if changed:
+                    self._save()
+                self.misses += 1
+                return None
+            best['last_used'] = now
+            best['hits'] += 1
+            self._save()
+            self.hits += 1
+            return list(best['chunks']), best_sim
+
+    def put(self, key, chunks):
+        """Grava a resposta completa (chunks do stream) da pergunta."""
+        now = time.time()
+        with self._locked():
+            self._purge(key.version, now)
+            self.entries = [
+                e for e in self.entries
+                if (e['question'], e['model'], e['scope']) != (key.question, key.model, key.scope)
+            ]
+            self.entries.append({
+                'question': key.question, 'vector': key.vector, 'model': key.model, 'version': key.version,
+                'scope': key.scope, 'chunks': list(chunks), 'created': now, 'last_used': now, 'hits': 0,
+            })
+            if len(self.entries) > self.max_items:
+                self.entries.sort(key=lambda e: e['last_used'])
+                self.entries = self.entries[-self.max_items:]
+            self._save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'size': len(self.entries),
+        }
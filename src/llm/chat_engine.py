@@ -1,40 +1,302 @@
+import json
+import os
 import sys
-import torch
+import threading
+from pathlib import Path
+import numpy as np
 import ollama
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
 from termcolor import colored
 
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.embeddings.cache import EmbeddingCache
+from src.embeddings.stores import VECTOR_BACKEND, open_store
+from src.embeddings.encoders import EMBEDDING_BACKEND, cache_name, load_encoder
+from src.ingestion.dataset import CORPUS_DIR, is_partitioned, load_messages, search_filters
+from src.ingestion.message_index import MessageIndex
+from src.llm.answer_cache import AnswerCache, AnswerKey
+from src.llm.context_packer import Passage, message_key, pack_context
+from src.llm.query_cache import QueryCache, normalize_query
+from src.llm.query_filters import parse_filters, parse_period, wants_summary
+from src.llm.summaries import SummaryIndex
+
 # --- CONFIGURAÇÃO ---
 OLLAMA_MODEL = "deepseek-r1:8b" 
 EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 COLLECTION_NAME = "whatsapp_chat"
-VECTOR_DB_PATH = "./data/qdrant_db"
+# No modo janelas cada hit já traz várias mensagens
+WINDOW_HIT_LIMIT = 5
+# Caches de consulta em memória (LRU + TTL em segundos), esvaziados quando a coleção muda
+QUERY_VECTOR_CACHE_SIZE = 1_024
+QUERY_VECTOR_CACHE_TTL = 3_600
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL = 600
+# "dense" (só vetores), "hybrid" (vetores + BM25) ou "lexical" (só BM25, sem carregar o encoder)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_MODES = ["dense", "hybrid", "lexical"]
+# Dados cujo índice BM25 é usado (o primeiro que tiver índice)
+MESSAGES_PATHS = ["data/processed/chat_history.parquet", CORPUS_DIR]
+# Reciprocal-rank fusion: cada lista contribui 1 / (RRF_K + posição)
+RRF_K = 60
+# Mensagens vizinhas incluídas antes e depois de cada hit
+NEIGHBOR_RADIUS = 2
+# Teto de tokens do contexto no prompt (limita o prefill e o tempo até o primeiro token)
+CONTEXT_TOKEN_BUDGET = 1_500
 
 class WhatsAppChat:
-    def __init__(self):
+    def __init__(self, retrieval=RETRIEVAL_MODE):
         print(colored("⏳ Inicializando componentes...", "yellow"))
-        self.client = QdrantClient(path=VECTOR_DB_PATH)
-        print(colored("🧠 Carregando modelo de embedding...", "yellow"))
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.encoder = SentenceTransformer(EMBEDDING_MODEL, device=device)
-        print(colored(f"✅ Sistema pronto! Usando: {OLLAMA_MODEL}", "green"))
-
-    def get_context(self, query_text, limit=15):
-        query_vector = self.encoder.encode(query_text).tolist()
-        results = self.client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=limit
-        ).points
-        
-        context_str = ""
-        for hit in results:
-            msg = hit.payload
-            context_str += f"[{msg['date']} {msg['author']}]: {msg['content']}\n"
-        return context_str
-
-    def chat_loop(self):
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperação desconhecido: {retrieval} (use {RETRIEVAL_MODES})")
+        # Índice de mensagens da ingestão: BM25 e vizinhas de cada hit
+        self.messages = next((ix for ix in map(MessageIndex, MESSAGES_PATHS) if ix.exists()), None)
+        if self.messages is None and retrieval == "lexical":
+            raise FileNotFoundError("Índice de mensagens não encontrado: rode a ingestão (ou `cli.py index`) primeiro.")
+        if self.messages is None:
+            print(colored("⚠️ Índice de mensagens não encontrado: só busca vetorial, sem vizinhas.", "yellow"))
+            retrieval = "dense"
+        self.retrieval = retrieval
+        # Resumos por dia/semana/mês (`cli.py summarize`) para perguntas sobre um período
+        data_path = next((p for p in MESSAGES_PATHS if Path(p).exists()), None)
+        self.summaries = SummaryIndex(data_path) if data_path else None
+
+        self.store = self.encoder = self.embedding_cache = None
+        self.index_mode = "messages"
+        if retrieval != "lexical":
+            # Qdrant ou índice numpy (VECTOR_BACKEND); o numpy aceita vários processos lendo juntos
+            self.store = open_store(COLLECTION_NAME, VECTOR_BACKEND)
+            self.index_mode = self.store.info()['mode']
+            print(colored(f"🧠 Carregando modelo de embedding ({EMBEDDING_BACKEND})...", "yellow"))
+            # Com EMBEDDING_BACKEND=onnx/onnx-int8 o torch nem é importado
+            self.encoder = load_encoder(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+            # Mesmo cache da vetorização: perguntas repetidas não passam pelo modelo
+            self.embedding_cache = EmbeddingCache(cache_name(EMBEDDING_MODEL, EMBEDDING_BACKEND))
+        self.query_vectors = QueryCache(QUERY_VECTOR_CACHE_SIZE, QUERY_VECTOR_CACHE_TTL)
+        self.query_results = QueryCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        # Respostas já geradas, em disco: pergunta parecida + mesma versão da coleção = sem LLM
+        self.answers = AnswerCache(COLLECTION_NAME)
+        self.collection_version = self.current_version()
+        self.known = None
+        # A API recupera de várias threads; encoder, cache de embeddings e índices não são thread-safe
+        self.lock = threading.RLock()
+        print(colored(f"✅ Sistema pronto! Usando: {OLLAMA_MODEL} (recuperação {self.retrieval})", "green"))
+
+    @staticmethod
+    def expand_hit(payload):
+        """Mensagens de um hit: a própria mensagem ou as mensagens da janela."""
+        if 'messages' not in payload:
+            return [payload]
+        return [{**msg, 'chat_id': payload.get('chat_id')} for msg in payload['messages']]
+
+    def current_version(self):
+        return (
+            self.store.current_version() if self.store else None,
+            self.messages.current_version() if self.messages else None,
+            self.summaries.current_version() if self.summaries else None,
+        )
+
+    def sync_caches(self):
+        """Esvazia os caches de consulta se a coleção ou o índice BM25 mudaram."""
+        version = self.current_version()
+        if version != self.collection_version:
+            self.query_vectors.clear()
+            self.query_results.clear()
+            # Um rebuild pode ter trocado o modo de indexação
+            if self.store:
+                self.index_mode = self.store.info()['mode']
+            self.known = None
+            self.collection_version = version
+        return version
+
+    def cache_stats(self):
+        return {
+            'query_vectors': self.query_vectors.stats(),
+            'results': self.query_results.stats(),
+            'embedding_cache': {
+                'hits': self.embedding_cache.hits, 'misses': self.embedding_cache.misses,
+            } if self.embedding_cache else None,
+            'answers': self.answers.stats(),
+            'collection_version': self.collection_version,
+        }
+
+    def known_values(self):
+        """Autores e chat_ids dos dados, para o parser de filtros (relidos quando os dados mudam)."""
+        if self.known is None:
+            path = next((p for p in MESSAGES_PATHS if Path(p).exists()), None)
+            if path is None:
+                self.known = ([], [])
+            else:
+                columns = ['author'] + (['chat_id'] if is_partitioned(path) else [])
+                df = load_messages(path, columns=columns)
+                chat_ids = df['chat_id'].astype(str).unique().tolist() if 'chat_id' in df.columns else []
+                self.known = (df['author'].astype(str).unique().tolist(), chat_ids)
+        return self.known
+
+    def query_filters(self, question=None, authors=None, chat_ids=None, start=None, end=None):
+        """Filtros de busca normalizados. Com `question`, o que não veio explícito é tirado da pergunta."""
+        explicit = {'authors': authors, 'chat_ids': chat_ids, 'start': start, 'end': end}
+        if question:
+            with self.lock:
+                known = self.known_values()
+            parsed = parse_filters(question, *known)
+            explicit = {k: v if v is not None else parsed[k] for k, v in explicit.items()}
+        return search_filters(**explicit)
+
+    def question_vector(self, query):
+        """Vetor da pergunta (já normalizada), com cache em memória e em disco."""
+        query_vector = self.query_vectors.get(query)
+        if query_vector is None:
+            query_vector = self.embedding_cache.encode([query], self.encoder.encode)[0].tolist()
+            self.query_vectors.put(query, query_vector)
+        return query_vector
+
+    def dense_hits(self, query, limit, filters=None):
+        """Hits da busca vetorial: (mensagens, score, vetor), com cache do vetor da pergunta."""
+        query_vector = self.question_vector(query)
+        return [
+            (self.expand_hit(hit.payload), hit.score, np.asarray(hit.vector, dtype=np.float32))
+            for hit in self.store.search(query_vector, limit, filters, with_vectors=True)
+        ]
+
+    def lexical_hits(self, query, limit, filters=None):
+        """Hits do BM25 (nomes, números, links e gírias que a busca vetorial perde), sem vetor."""
+        results = self.messages.search(query, limit, filters)
+        docs = self.messages.documents([row for row, _ in results])
+        return [([doc], score, None) for doc, (_, score) in zip(docs, results)]
+
+    @staticmethod
+    def fuse(dense, lexical, limit):
+        """Reciprocal-rank fusion das duas listas de hits.
+
+        Uma mensagem do BM25 que já está num hit vetorial (ou na janela dele)
+        soma pontos a esse hit em vez de entrar de novo. O score devolvido é o
+        da fusão; o vetor é o do hit vetorial, quando houver.
+        """
+        hits, scores, owner = [], [], {}
+        for rank, (unit, _, vector) in enumerate(dense, 1):
+            for msg in unit:
+                owner.setdefault(message_key(msg), len(hits))
+            hits.append((unit, vector))
+            scores.append(1 / (RRF_K + rank))
+        for rank, (unit, _, vector) in enumerate(lexical, 1):
+            key = message_key(unit[0])
+            if key not in owner:
+                owner[key] = len(hits)
+                hits.append((unit, vector))
+                scores.append(0.0)
+            scores[owner[key]] += 1 / (RRF_K + rank)
+        order = sorted(range(len(hits)), key=lambda i: -scores[i])
+        return [(hits[i][0], scores[i], hits[i][1]) for i in order[:limit]]
+
+    def retrieve(self, query_text, limit, filters=None):
+        """Hits (mensagens, score, vetor) da pergunta no modo de recuperação configurado, com cache de resultado.
+
+        `filters` (ver `query_filters`) rodam dentro de cada índice, não depois.
+        """
+        version = self.sync_caches()
+        query = normalize_query(query_text)
+        key = (query, limit, self.retrieval, tuple(sorted((filters or {}).items())), version)
+        hits = self.query_results.get(key)
+        if hits is None:
+            dense = self.dense_hits(query, limit, filters) if self.retrieval != "lexical" else []
+            lexical = self.lexical_hits(query, limit, filters) if self.retrieval != "dense" else []
+            hits = self.fuse(dense, lexical, limit)
+            self.query_results.put(key, hits)
+        return hits
+
+    def expand(self, hits, radius):
+        """Cada hit vira o trecho com `radius` mensagens vizinhas de cada lado, lidas do índice de mensagens.
+
+        Trechos que se sobrepõem são unidos (score do melhor hit, vetor médio
+        dos hits); tudo sai de uma leitura só, sem novas buscas vetoriais.
+        """
+        passages = [Passage(unit, score, vector, {message_key(m) for m in unit}) for unit, score, vector in hits]
+        spans = []
+        for unit, _, _ in hits:
+            ids = [msg.get('msg_id') for msg in unit]
+            if None in ids:
+                return passages  # coleção vetorizada antes do msg_id: sem vizinhas
+            spans.append((unit[0].get('chat_id'), min(ids), max(ids)))
+
+        groups = self.messages.neighbors(spans, radius)
+        owner = {(msg.get('chat_id'), msg['msg_id']): i for i, group in enumerate(groups) for msg in group}
+        members = [[] for _ in groups]
+        for unit, score, vector in hits:
+            i = owner.get((unit[0].get('chat_id'), unit[0]['msg_id']))
+            if i is not None:
+                members[i].append((unit, score, vector))
+
+        expanded = []
+        for group, found in zip(groups, members):
+            vectors = [v / max(np.linalg.norm(v), 1e-12) for _, _, v in found if v is not None]
+            expanded.append(Passage(
+                group,
+                max((score for _, score, _ in found), default=0.0),
+                np.mean(vectors, axis=0) if vectors else None,
+                {message_key(m) for unit, _, _ in found for m in unit},
+            ))
+        return expanded
+
+    def summary_context(self, query_text, filters=None, token_budget=CONTEXT_TOKEN_BUDGET):
+        """Contexto vindo dos resumos se a pergunta pede uma visão geral de um período; senão None.
+
+        O período vem dos filtros ou, se não vier, da própria pergunta. Sem
+        período, só pedidos explícitos ("resuma", "retrospectiva") usam o chat
+        todo; perguntas abertas como "como foi a reunião?" ficam com a busca.
+        Filtro de autor também fica com a busca (os resumos são por chat).
+        """
+        filters = filters or {}
+        if not self.summaries or filters.get('authors'):
+            return None
+        if 'start' not in filters and 'end' not in filters:
+            start, end = parse_period(query_text)
+            filters = {**filters, **(search_filters(start=start, end=end) or {})}
+        if not wants_summary(query_text, period='start' in filters or 'end' in filters):
+            return None
+        return self.summaries.context(filters.get('start'), filters.get('end'), filters.get('chat_ids'), token_budget)
+
+    def build_context(self, query_text, limit=15, filters=None, neighbors=NEIGHBOR_RADIUS, token_budget=CONTEXT_TOKEN_BUDGET):
+        """Contexto do prompt e o relatório do empacotamento (tokens usados, economizados, duplicados).
+
+        Perguntas de período vão para os resumos pré-computados, quando existem.
+        """
+        with self.lock:
+            routed = self.summary_context(query_text, filters, token_budget)
+            if routed:
+                return routed
+            if self.index_mode == "windows":
+                limit = min(limit, WINDOW_HIT_LIMIT)
+            hits = self.retrieve(query_text, limit, filters)
+            if neighbors and self.messages:
+                passages = self.expand(hits, neighbors)
+            else:
+                passages = [Passage(unit, score, vector, {message_key(m) for m in unit}) for unit, score, vector in hits]
+        return pack_context(passages, token_budget)
+
+    def answer_key(self, question, model=OLLAMA_MODEL, scope=""):
+        """Chave do cache de respostas; `scope` separa prompts e filtros diferentes.
+
+        Período, autores e chats citados na pergunta entram sempre no escopo,
+        mesmo sem filtros: "o que aconteceu em março?" e "... em abril?" têm
+        embeddings quase iguais e não podem responder uma pela outra.
+        Sem encoder (modo lexical) só a mesma pergunta, normalizada, acerta.
+        """
+        query = normalize_query(question)
+        with self.lock:
+            version = self.sync_caches()
+            mentions = parse_filters(question, *self.known_values())
+            vector = None
+            if self.encoder:
+                vector = np.asarray(self.question_vector(query), dtype=np.float32)
+                vector /= max(np.linalg.norm(vector), 1e-12)
+        scope = json.dumps({'scope': scope, 'mentions': mentions}, sort_keys=True)
+        return AnswerKey(query, vector, model, json.dumps(version), scope)
+
+    def get_context(self, query_text, limit=15, filters=None, neighbors=NEIGHBOR_RADIUS, token_budget=CONTEXT_TOKEN_BUDGET):
+        return self.build_context(query_text, limit, filters, neighbors, token_budget)[0]
+
+    def chat_loop(self, parse_filters=False):
         print("\n" + "="*50)
         print("🤖 WHATSAPP AI - DEEPSEEK R1 (Digite 'sair')")
         print("="*50 + "\n")
@@ -45,29 +307,45 @@ class WhatsAppChat:
                 if user_input.lower() in ['sair', 'exit']: break
                 if not user_input.strip(): continue
 
-                print(colored("🔍 Recuperando contexto...", "grey"))
-                context = self.get_context(user_input)
-                
-                system_prompt = f"""
-                Você é um analista de conversas.
-                Responda em Português.
-                Analise o contexto abaixo para responder.
-                
-                CONTEXTO:
-                {context}
-                """
+                filters = self.query_filters(user_input) if parse_filters else None
+                if filters:
+                    print(colored(f"🔎 Filtros: {filters}", "grey"))
+                answer_key = self.answer_key(user_input, scope=f"cli:{json.dumps(filters, sort_keys=True)}")
+                cached = self.answers.get(answer_key)
 
-                print(colored("🤖 Gerando resposta...", "grey"))
-                
-                # --- Lógica de Streaming com Cores ---
-                stream = ollama.chat(
-                    model=OLLAMA_MODEL,
-                    messages=[
-                        {'role': 'system', 'content': system_prompt},
-                        {'role': 'user', 'content': user_input},
-                    ],
-                    stream=True,
-                )
+                if cached:
+                    print(colored(f"⚡ Resposta do cache (similaridade {cached[1]:.2f})", "grey"))
+                    stream = ({'message': {'content': c}} for c in cached[0])
+                else:
+                    print(colored("🔍 Recuperando contexto...", "grey"))
+                    context, packing = self.build_context(user_input, filters=filters)
+                    if packing.get('route') == 'summaries':
+                        print(colored(f"🗓️ Pergunta de período: {packing['summaries']} resumos ({packing['level']})", "grey"))
+                    print(colored(
+                        f"📦 Contexto: {packing['tokens']} tokens de {packing['tokens_before']} "
+                        f"({packing['tokens_saved']} economizados, {packing['duplicates']} trechos duplicados)", "grey",
+                    ))
+
+                    system_prompt = f"""
+                    Você é um analista de conversas.
+                    Responda em Português.
+                    Analise o contexto abaixo para responder.
+
+                    CONTEXTO:
+                    {context}
+                    """
+
+                    print(colored("🤖 Gerando resposta...", "grey"))
+
+                    # --- Lógica de Streaming com Cores ---
+                    stream = ollama.chat(
+                        model=OLLAMA_MODEL,
+                        messages=[
+                            {'role': 'system', 'content': system_prompt},
+                            {'role': 'user', 'content': user_input},
+                        ],
+                        stream=True,
+                    )
 
                 full_response = ""
                 thinking_mode = False
@@ -75,8 +353,10 @@ class WhatsAppChat:
                 # Buffer para detectar tags que chegam quebradas
                 buffer = ""
 
+                chunks = []
                 for chunk in stream:
                     content = chunk['message']['content']
+                    chunks.append(content)
                     
                     # Imprime pensamento em AMARELO e resposta em VERDE
                     if "<think>" in content:
@@ -96,6 +376,8 @@ class WhatsAppChat:
 
                     full_response += content
                 print("\n")
+                if not cached:
+                    self.answers.put(answer_key, chunks)
 
             except KeyboardInterrupt:
                 break
@@ -0,0 +1,135 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from src.embeddings.windows import approx_tokens
+from src.ingestion.lexical import fold_text, tokenize
+
+# Configurações
+# Peso da relevância contra a novidade no MMR (1.0 = só relevância)
+MMR_LAMBDA = 0.7
+# Trechos com similaridade acima disso contam como duplicados do que já entrou
+DUPLICATE_SIMILARITY = 0.95
+# Mensagens repetidas (encaminhadas, coladas) só colapsam a partir desse tamanho; "sim"/"kkk" ficam
+DUPLICATE_MIN_CHARS = 20
+
+# Candidato ao contexto: mensagens em ordem, relevância da busca, vetor (ou None, hit só do BM25)
+# e as chaves das mensagens que foram hit (as demais são vizinhas, cortadas primeiro)
+Passage = namedtuple("Passage", ["messages", "score", "vector", "hit_keys"])
+
+def message_key(msg):
+    """Identidade de uma mensagem vinda de qualquer índice (vetorial, janela ou BM25)."""
+    return (msg.get('chat_id'), msg['date'], msg['time'], msg['author'], msg['content'])
+
+def format_message(msg):
+    return f"[{msg['date']} {msg['author']}]: {msg['content']}\n"
+
+def _content_key(msg):
+    content = str(msg['content'])
+    if len(content) < DUPLICATE_MIN_CHARS:
+        return None
+    return re.sub(r'\s+', ' ', fold_text(content)).strip()
+
+def _similarities(passages):
+    """Matriz de similaridade entre trechos: cosseno dos vetores ou, sem vetor, Jaccard dos termos."""
+    n = len(passages)
+    sims = np.zeros((n, n), dtype=np.float32)
+    vectors = [
+        np.asarray(p.vector, dtype=np.float32) / max(np.linalg.norm(p.vector), 1e-12) if p.vector is not None else None
+        for p in passages
+    ]
+    terms = [set(tokenize(" ".join(str(m['content']) for m in p.messages))) for p in passages]
+    for i in range(n):
+        for j in range(i + 1, n):
+            if vectors[i] is not None and vectors[j] is not None:
+                sim = float(vectors[i] @ vectors[j])
+            else:
+                union = terms[i] | terms[j]
+                sim = len(terms[i] & terms[j]) / len(union) if union else 0.0
+            sims[i, j] = sims[j, i] = sim
+    return sims
+
+def _trim(messages, costs, hit_keys, budget):
+    """Corta vizinhas das pontas até o trecho caber no orçamento (hits saem por último)."""
+    lo, hi = 0, len(messages)
+    total = sum(costs)
+    while total > budget and hi - lo > 1:
+        left_hit = message_key(messages[lo]) in hit_keys
+        right_hit = message_key(messages[hi - 1]) in hit_keys
+        if left_hit and not right_hit or (left_hit == right_hit and costs[hi - 1] >= costs[lo]):
+            hi -= 1
+            total -= costs[hi]
+        else:
+            total -= costs[lo]
+            lo += 1
+    return (messages[lo:hi], total) if total <= budget else ([], 0)
+
+def pack_context(passages, token_budget, mmr_lambda=MMR_LAMBDA):
+    """Monta o contexto do prompt dentro de `token_budget` tokens.
+
+    Escolhe os trechos por maximal marginal relevance (relevância da busca
+    menos a maior similaridade com o que já entrou), descarta trechos e
+    mensagens duplicados e devolve o que coube em ordem cronológica.
+    Devolve (texto, relatório com os tokens usados e economizados).
+    """
+    # Linha de base: tudo o que veio da busca, sem repetir mensagem (o contexto antigo)
+    seen, tokens_before = set(), 0
+    for passage in passages:
+        for msg in passage.messages:
+            if message_key(msg) not in seen:
+                seen.add(message_key(msg))
+                tokens_before += approx_tokens(format_message(msg))
+
+    report = {'candidates': len(passages), 'packed': 0, 'duplicates': 0, 'trimmed': 0, 'dropped': 0}
+    top = max((p.score for p in passages), default=0.0) or 1.0
+    relevance = np.array([p.score / top for p in passages], dtype=np.float32)
+    sims = _similarities(passages)
+    redundancy = np.zeros(len(passages), dtype=np.float32)
+    remaining = list(range(len(passages)))
+    packed, keys, contents, used = [], set(), set(), 0
+
+    while remaining and used < token_budget:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+        remaining.remove(best)
+        passage = passages[best]
+        if packed and redundancy[best] >= DUPLICATE_SIMILARITY:
+            report['duplicates'] += 1
+            continue
+
+        # Mensagens que já estão no contexto (janelas sobrepostas, encaminhadas) entram uma vez só
+        messages = []
+        for msg in passage.messages:
+            content = _content_key(msg)
+            if message_key(msg) in keys or (content is not None and content in contents):
+                continue
+            messages.append(msg)
+        if not messages:
+            report['duplicates'] += 1
+            continue
+
+        costs = [approx_tokens(format_message(m)) for m in messages]
+        kept, cost = _trim(messages, costs, passage.hit_keys, token_budget - used)
+        if not kept:
+            report['dropped'] += 1
+            continue
+        report['trimmed'] += int(len(kept) < len(messages))
+        for msg in kept:
+            keys.add(message_key(msg))
+            content = _content_key(msg)
+            if content is not None:
+                contents.add(content)
+        packed.append(kept)
+        used += cost
+        redundancy = np.maximum(redundancy, sims[best])
+    report['dropped'] += len(remaining)
+
+    # Ordem cronológica entre trechos (coleções antigas sem timestamp ficam na ordem do MMR)
+    if all(p[0].get('timestamp') for p in packed):
+        packed.sort(key=lambda p: p[0]['timestamp'])
+    text = "\n".join("".join(format_message(m) for m in p) for p in packed)
+    report.update({
+        'packed': len(packed), 'tokens': used, 'tokens_before': tokens_before,
+        'tokens_saved': max(tokens_before - used, 0), 'budget': token_budget,
+    })
+    return text, report
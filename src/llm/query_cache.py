@@ -0,0 +1,55 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+def normalize_query(text):
+    """Chave de cache da pergunta: Unicode NFC, minúsculas e espaços colapsados."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip().casefold()
+
+class QueryCache:
+    """Cache LRU em memória com expiração (TTL) e contadores de acerto.
+
+    Seguro entre threads: a API atende várias requisições no mesmo processo.
+    """
+
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.items[key]  # expirado
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic(), value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'size': len(self.items),
+        }
@@ -0,0 +1,103 @@
+import re
+
+import pandas as pd
+
+from src.ingestion.lexical import fold_text
+
+# Meses por extenso, sem acento (ver fold_text); abreviações colidem com palavras ("mar", "dez")
+MONTHS = {
+    'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6,
+    'julho': 7, 'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12,
+}
+MONTH_PATTERN = re.compile(r'\b(' + '|'.join(MONTHS) + r')\b(?:\s*(?:de|/)\s*(\d{4}))?')
+DATE_PATTERN = re.compile(r'\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b')
+YEAR_PATTERN = re.compile(r'\b(?:em|de)\s+((?:19|20)\d{2})\b')
+# Períodos relativos a hoje: (início, fim)
+RELATIVE = {
+    'hoje': lambda today: (today, today),
+    'ontem': lambda today: (today - pd.Timedelta(days=1), today - pd.Timedelta(days=1)),
+    # Segunda a domingo da semana anterior
+    'semana passada': lambda today: (
+        today - pd.Timedelta(days=today.weekday() + 7), today - pd.Timedelta(days=today.weekday() + 1),
+    ),
+    'mes passado': lambda today: (
+        (today.replace(day=1) - pd.Timedelta(days=1)).replace(day=1), today.replace(day=1) - pd.Timedelta(days=1),
+    ),
+    'ano passado': lambda today: (pd.Timestamp(today.year - 1, 1, 1), pd.Timestamp(today.year - 1, 12, 31)),
+}
+# Primeiro nome só identifica o autor se tiver pelo menos isso de letras
+MIN_FIRST_NAME = 3
+# Pedidos explícitos de visão geral, respondidos pelos resumos mesmo sem período (o chat todo)
+SUMMARY_INTENT = re.compile(r'\b(resum\w*|retrospectiva|panorama|principais (assuntos|temas|acontecimentos))\b')
+# Perguntas abertas: só são de visão geral com um período ("como foi março?", não "como foi a reunião?")
+PERIOD_INTENT = re.compile(r'\b(o que (aconteceu|rolou|houve|teve)|como (foi|foram)|acontecimentos|novidades)\b')
+
+def _mentions(question, name):
+    return re.search(r'(?<!\w)' + re.escape(fold_text(name)) + r'(?!\w)', question) is not None
+
+def parse_authors(question, authors):
+    """Autores citados na pergunta: pelo nome completo ou por um primeiro nome que só um deles tem."""
+    question = fold_text(question)
+    found = {a for a in authors if _mentions(question, a)}
+    first_names = {}
+    for author in authors:
+        first = fold_text(author).split()[0] if author.split() else ''
+        if len(first) >= MIN_FIRST_NAME and first.isalpha():
+            first_names.setdefault(first, []).append(author)
+    for first, owners in first_names.items():
+        if len(owners) == 1 and _mentions(question, first):
+            found.add(owners[0])
+    return sorted(found)
+
+def parse_period(question, today=None):
+    """(início, fim) citado na pergunta: datas dd/mm[/aaaa], "março [de 2024]", "em 2023" ou relativos."""
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+    question = fold_text(question)
+
+    dates = []
+    for day, month, year in DATE_PATTERN.findall(question):
+        year = int(year) + (2000 if len(year) == 2 else 0) if year else today.year
+        try:
+            dates.append(pd.Timestamp(year, int(month), int(day)))
+        except ValueError:
+            continue  # não é data (ex.: placar 3/45)
+    if dates:
+        return min(dates), max(dates)
+
+    months = MONTH_PATTERN.findall(question)
+    if months:
+        starts = []
+        for name, year in months:
+            number = MONTHS[name]
+            # Sem ano: a ocorrência mais recente desse mês
+            year = int(year) if year else today.year - (number > today.month)
+            starts.append(pd.Timestamp(year, number, 1))
+        return min(starts), max(starts) + pd.offsets.MonthEnd(0)
+
+    for phrase, period in RELATIVE.items():
+        if re.search(r'\b' + phrase + r'\b', question):
+            return period(today)
+
+    years = YEAR_PATTERN.findall(question)
+    if years:
+        return pd.Timestamp(int(min(years)), 1, 1), pd.Timestamp(int(max(years)), 12, 31)
+    return None, None
+
+def wants_summary(question, period=False):
+    """A pergunta pede uma visão geral ("resuma o grupo", ou "o que aconteceu em março?" com `period`)."""
+    question = fold_text(question)
+    return SUMMARY_INTENT.search(question) is not None or (period and PERIOD_INTENT.search(question) is not None)
+
+def parse_filters(question, authors=(), chat_ids=(), today=None):
+    """Filtros (autores, chats, período) tirados de uma pergunta em português.
+
+    Devolve os argumentos de `search_filters`; o que não aparece na pergunta fica None.
+    """
+    start, end = parse_period(question, today)
+    folded = fold_text(question)
+    return {
+        'authors': parse_authors(question, authors) or None,
+        'chat_ids': [c for c in chat_ids if _mentions(folded, c.replace('_', ' ')) or _mentions(folded, c)] or None,
+        'start': start.strftime('%Y-%m-%d') if start is not None else None,
+        'end': end.strftime('%Y-%m-%d') if end is not None else None,
+    }
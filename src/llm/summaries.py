@@ -0,0 +1,260 @@
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+import ollama
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from termcolor import colored
+
+from src.embeddings.windows import approx_tokens
+from src.ingestion.dataset import is_partitioned, load_messages
+
+# Configurações
+SUMMARY_MODEL = "deepseek-r1:8b"
+# Do mais detalhado ao mais geral; semanas e meses são resumos dos dias
+LEVELS = ["day", "week", "month"]
+LEVEL_LABELS = {'day': 'Dia', 'week': 'Semana', 'month': 'Mês'}
+# Entrada máxima de uma chamada ao LLM; acima disso o map-reduce divide em partes
+SUMMARY_INPUT_TOKENS = 3_000
+# Resumos novos entre gravações do arquivo (uma interrupção perde no máximo isso)
+SAVE_EVERY = 20
+PROMPTS = {
+    'day': (
+        "Resuma as mensagens abaixo, de um grupo de WhatsApp no dia {label}, em até 5 frases: "
+        "assuntos, decisões, combinados e quem participou. Responda em Português."
+    ),
+    'week': (
+        "Abaixo estão resumos diários de um grupo de WhatsApp na semana de {label}. "
+        "Junte-os em um resumo de até 8 frases com os principais assuntos, decisões e acontecimentos. "
+        "Responda em Português."
+    ),
+    'month': (
+        "Abaixo estão resumos diários de um grupo de WhatsApp no mês {label}. "
+        "Junte-os em um resumo de até 10 frases com os principais assuntos, decisões e acontecimentos. "
+        "Responda em Português."
+    ),
+}
+THINK_PATTERN = re.compile(r'<think>.*?</think>', re.S)
+
+SUMMARY_SCHEMA = pa.schema([
+    ('level', pa.string()),
+    ('chat_id', pa.string()),
+    ('start', pa.string()),
+    ('end', pa.string()),
+    # Hash das mensagens (dia) ou dos hashes dos dias (semana/mês): muda só se a entrada mudou
+    ('source_hash', pa.string()),
+    ('messages', pa.int64()),
+    ('source_tokens', pa.int64()),
+    ('summary', pa.string()),
+    ('model', pa.string()),
+    ('created', pa.float64()),
+])
+
+def summaries_path(path):
+    """Resumos ao lado do dataset (ou `_summaries.parquet` no corpus, ignorado pelo pyarrow).
+
+    Fora do diretório do chat: um reprocessamento completo troca o diretório
+    inteiro, e os resumos devem sobreviver a isso.
+    """
+    path = Path(path)
+    return path / "_summaries.parquet" if is_partitioned(path) else Path(f"{path}.summaries.parquet")
+
+def _digest(model, parts):
+    # O modelo entra no hash: trocar o SUMMARY_MODEL regera todos os níveis
+    parts = [model, *parts]
+    return hashlib.blake2b("\x1f".join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+def _period(day, level):
+    """(início, fim) do dia/semana (segunda a domingo)/mês que contém `day`."""
+    if level == 'day':
+        return day, day
+    if level == 'week':
+        start = day - pd.Timedelta(days=day.weekday())
+        return start, start + pd.Timedelta(days=6)
+    return day.replace(day=1), day + pd.offsets.MonthEnd(0)
+
+def _label(level, start, end):
+    if level == 'month':
+        return start.strftime('%Y-%m')
+    return start.strftime('%Y-%m-%d') if level == 'day' else f"{start:%Y-%m-%d} a {end:%Y-%m-%d}"
+
+def _generate(client, model, instruction, text):
+    response = client.chat(
+        model=model,
+        messages=[{'role': 'system', 'content': instruction}, {'role': 'user', 'content': text}],
+    )
+    # O raciocínio do R1 não faz parte do resumo
+    return THINK_PATTERN.sub('', response['message']['content']).strip()
+
+def map_reduce(client, model, instruction, texts, max_tokens=SUMMARY_INPUT_TOKENS):
+    """Um resumo de `texts`: numa chamada se cabem em `max_tokens`, senão por partes e depois das partes."""
+    groups, current, tokens = [], [], 0
+    for text in texts:
+        cost = approx_tokens(text)
+        if current and tokens + cost > max_tokens:
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(text)
+        tokens += cost
+    groups.append(current)
+    if len(groups) == 1:
+        return _generate(client, model, instruction, "\n".join(groups[0]))
+    parts = [
+        _generate(client, model, f"{instruction} (parte {i} de {len(groups)})", "\n".join(group))
+        for i, group in enumerate(groups, 1)
+    ]
+    return map_reduce(client, model, instruction, parts, max_tokens)
+
+def _save(out, rows):
+    tmp_path = out.with_suffix(".tmp")
+    rows = sorted(rows, key=lambda r: (LEVELS.index(r['level']), r['chat_id'], r['start']))
+    pq.write_table(pa.Table.from_pylist(rows, schema=SUMMARY_SCHEMA), tmp_path)
+    os.replace(tmp_path, out)
+
+def build_summaries(path, model=SUMMARY_MODEL, client=None):
+    """Resumos diários, semanais e mensais de cada chat, gerados pelo LLM em map-reduce.
+
+    Incremental: um período só volta ao LLM se as mensagens dele (ou os
+    resumos diários, para semanas e meses) ou o modelo mudaram desde a
+    última execução.
+    Grava em `summaries_path(path)` uma linha por período com o intervalo,
+    o hash da entrada e o resumo.
+    """
+    client = client or ollama.Client()
+    out = summaries_path(path)
+    previous = {}
+    if out.exists():
+        previous = {(r['level'], r['chat_id'], r['start']): r for r in pq.read_table(out).to_pylist()}
+
+    partitioned = is_partitioned(path)
+    columns = ['timestamp', 'author', 'content'] + (['chat_id'] if partitioned else [])
+    df = load_messages(path, columns=columns).dropna(subset=['timestamp'])
+    df['chat_key'] = df['chat_id'].astype(str) if partitioned else ""
+    df = df.sort_values(['chat_key', 'timestamp'], kind='stable')
+    df['day'] = df['timestamp'].dt.normalize()
+    df['line'] = df['timestamp'].dt.strftime('%H:%M') + " " + df['author'].astype(str) + ": " + df['content'].astype(str)
+
+    rows, stats = {}, {'generated': 0, 'reused': 0}
+
+    def summarize(key, source_hash, instruction, texts, fields):
+        old = previous.get(key)
+        if old is not None and old['source_hash'] == source_hash:
+            rows[key] = old
+            stats['reused'] += 1
+            return
+        level, chat_id, start = key
+        print(colored(f"📝 {LEVEL_LABELS[level]} {fields['label']}{f' ({chat_id})' if chat_id else ''}...", "grey"))
+        rows[key] = {
+            'level': level, 'chat_id': chat_id, 'start': start, 'end': fields['end'],
+            'source_hash': source_hash, 'messages': fields['messages'], 'source_tokens': fields['source_tokens'],
+            'summary': map_reduce(client, model, instruction, texts), 'model': model, 'created': time.time(),
+        }
+        stats['generated'] += 1
+        if stats['generated'] % SAVE_EVERY == 0:
+            _save(out, {**previous, **rows}.values())
+
+    days = {}
+    for (chat_id, day), group in df.groupby(['chat_key', 'day'], sort=True):
+        lines = group['line'].tolist()
+        key = ('day', chat_id, day.strftime('%Y-%m-%d'))
+        label = _label('day', day, day)
+        summarize(key, _digest(model, lines), PROMPTS['day'].format(label=label), lines, {
+            'label': label, 'end': key[2], 'messages': len(lines),
+            'source_tokens': sum(approx_tokens(line) for line in lines),
+        })
+        days.setdefault(chat_id, []).append((day, rows[key]))
+
+    for level in LEVELS[1:]:
+        for chat_id, chat_days in days.items():
+            periods = {}
+            for day, row in chat_days:
+                periods.setdefault(_period(day, level), []).append(row)
+            for (start, end), children in periods.items():
+                label = _label(level, start, end)
+                key = (level, chat_id, start.strftime('%Y-%m-%d'))
+                texts = [f"{child['start']}: {child['summary']}" for child in children]
+                summarize(key, _digest(model, [child['source_hash'] for child in children]), PROMPTS[level].format(label=label), texts, {
+                    'label': label, 'end': end.strftime('%Y-%m-%d'),
+                    'messages': sum(child['messages'] for child in children),
+                    'source_tokens': sum(child['source_tokens'] for child in children),
+                })
+
+    # Períodos que não têm mais mensagens saem do arquivo
+    _save(out, rows.values())
+    counts = {level: sum(k[0] == level for k in rows) for level in LEVELS}
+    print(colored(
+        f"🗓️ Resumos: {counts['day']} dias, {counts['week']} semanas, {counts['month']} meses "
+        f"({stats['generated']} gerados, {stats['reused']} reaproveitados) em {out}", "green",
+    ))
+    return stats
+
+class SummaryIndex:
+    """Leitura dos resumos de `build_summaries` para perguntas sobre um período (ou o chat todo)."""
+
+    def __init__(self, path):
+        self.path = summaries_path(path)
+        self.mtime = None
+        self.rows = None
+
+    def exists(self):
+        return self.path.exists()
+
+    def current_version(self):
+        return self.path.stat().st_mtime_ns if self.exists() else None
+
+    def _refresh(self):
+        mtime = self.current_version()
+        if mtime != self.mtime:
+            self.rows = pd.read_parquet(self.path)
+            self.mtime = mtime
+
+    def context(self, start=None, end=None, chat_ids=None, token_budget=None):
+        """(texto, relatório) com os resumos do período, no nível mais detalhado que cabe no orçamento.
+
+        `start`/`end` como em `search_filters` (fim exclusivo). None se não
+        há resumo no período.
+        """
+        if not self.exists():
+            return None
+        self._refresh()
+        rows = self.rows
+        if chat_ids:
+            rows = rows[rows['chat_id'].isin(chat_ids)]
+        if start is not None:
+            rows = rows[rows['end'] >= start[:10]]
+        if end is not None:
+            last_day = (pd.Timestamp(end) - pd.Timedelta(seconds=1)).strftime('%Y-%m-%d')
+            rows = rows[rows['start'] <= last_day]
+        if rows.empty:
+            return None
+
+        for level in LEVELS:
+            chosen = rows[rows['level'] == level].sort_values(['start', 'chat_id'])
+            lines = [
+                f"[{LEVEL_LABELS[level]} {_label(level, pd.Timestamp(r.start), pd.Timestamp(r.end))}"
+                f"{f' · {r.chat_id}' if r.chat_id else ''}]: {r.summary}\n"
+                for r in chosen.itertuples()
+            ]
+            costs = [approx_tokens(line) for line in lines]
+            if token_budget is None or sum(costs) <= token_budget:
+                break
+        # Nem os meses cabem: os mais recentes que couberem, em ordem cronológica
+        kept, used = [], 0
+        for line, cost in zip(reversed(lines), reversed(costs)):
+            if token_budget is not None and used + cost > token_budget:
+                break
+            kept.insert(0, line)
+            used += cost
+        if not kept:
+            return None
+
+        tokens_before = int(rows.loc[rows['level'] == 'day', 'source_tokens'].sum())
+        return "".join(kept), {
+            'route': 'summaries', 'level': level, 'summaries': len(kept), 'truncated': len(kept) < len(lines),
+            'tokens': used, 'tokens_before': tokens_before, 'tokens_saved': max(tokens_before - used, 0),
+            'duplicates': 0, 'budget': token_budget,
+        }
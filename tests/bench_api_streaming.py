@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from termcolor import colored
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tests.synthetic_chat import generate_chat
+
+# --- CONFIG ---
+N_MESSAGES = 10_000
+CONCURRENCY = [1, 4, 16]
+# Respostas por cliente em cada rodada
+REQUESTS_PER_CLIENT = 2
+# LLM falso: tokens por resposta e intervalo entre eles (~50 tokens/s, como o 8B)
+STUB_TOKENS = 50
+STUB_TOKEN_DELAY = 0.02
+# Com N clientes, o throughput deve chegar a pelo menos essa fração de N x o de 1 cliente
+MIN_SCALING = 0.5
+# Rodada de admissão: limite de gerações do scheduler e rajada de clientes
+ADMISSION_IN_FLIGHT = 2
+ADMISSION_CLIENTS = 24
+QUESTION = "quem combinou a viagem para a praia?"
+
+def log(msg, status="INFO"):
+    colors = {"INFO": "cyan", "PASS": "green", "FAIL": "red", "WARN": "yellow"}
+    prefix = {"INFO": "ℹ️", "PASS": "✅", "FAIL": "❌", "WARN": "⚠️"}
+    print(colored(f"{prefix[status]} {msg}", colors[status]))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def stub_llm(tokens, delay):
+    """Servidor no formato do Ollama (`POST /api/chat`, NDJSON) que gera tokens em ritmo fixo."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    stub = FastAPI()
+
+    @stub.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+
+        async def stream():
+            for i in range(tokens):
+                await asyncio.sleep(delay)
+                chunk = {'model': body['model'], 'message': {'role': 'assistant', 'content': f"tok{i} "}, 'done': False}
+                yield json.dumps(chunk) + "\n"
+            yield json.dumps({'model': body['model'], 'message': {'role': 'assistant', 'content': ''}, 'done': True}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return stub
+
+def serve(app, port):
+    """Sobe um app ASGI com uvicorn numa thread e espera ele aceitar conexões."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def add_legacy_route(api):
+    """O endpoint de antes: recuperação e `ollama.chat` síncronos dentro do event loop."""
+    import ollama
+
+    @api.app.post("/bench/legacy_chat")
+    async def legacy_chat(req: api.ChatRequest):
+        context = api.chat_engine.get_context(req.message, limit=req.limit)
+
+        async def generate():
+            stream = ollama.chat(
+                model=api.OLLAMA_MODEL,
+                messages=[{'role': 'system', 'content': context}, {'role': 'user', 'content': req.message}],
+                stream=True,
+            )
+            for chunk in stream:
+                yield chunk['message']['content']
+
+        return api.StreamingResponse(generate(), media_type="text/plain")
+
+async def one_request(client, url, client_id):
+    """(tempo até o primeiro token da resposta, tempo total) de um stream; None se veio 429."""
+    t0 = time.perf_counter()
+    first = None
+    headers = {"X-Client-Id": client_id}
+    # Sempre a mesma pergunta: sem o cache de respostas, todas passam pelo LLM
+    body = {'message': QUESTION, 'answer_cache': False}
+    async with client.stream("POST", url, json=body, headers=headers) as response:
+        if response.status_code == 429:
+            return None
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            # Linhas "[fila] ..." chegam antes da resposta
+            answer = "".join(l for l in chunk.splitlines(True) if not l.startswith("[fila]"))
+            if answer and first is None:
+                first = time.perf_counter() - t0
+    return first, time.perf_counter() - t0
+
+async def load(url, concurrency, per_client):
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker(n):
+            return [await one_request(client, url, f"cliente-{n}") for _ in range(per_client)]
+
+        t0 = time.perf_counter()
+        results = [r for rs in await asyncio.gather(*(worker(n) for n in range(concurrency))) for r in rs]
+        wall = time.perf_counter() - t0
+    rejected = sum(r is None for r in results)
+    results = [r for r in results if r is not None]
+    ttft = sorted(r[0] for r in results)
+    return {
+        'requests': len(results),
+        'rejected': rejected,
+        'req_per_s': len(results) / wall,
+        'ttft_mean': sum(ttft) / len(ttft),
+        'ttft_p95': ttft[min(len(ttft) - 1, int(len(ttft) * 0.95))],
+    }
+
+def admission(api, port):
+    """Mais clientes que vagas: os excedentes esperam na fila, o resto leva 429."""
+    from src.interface.scheduler import GenerationScheduler
+
+    api.scheduler = GenerationScheduler(max_in_flight=ADMISSION_IN_FLIGHT, max_queue=ADMISSION_CLIENTS // 2)
+    r = asyncio.run(load(f"http://127.0.0.1:{port}/v1/chat", ADMISSION_CLIENTS, 1))
+    stats = httpx.get(f"http://127.0.0.1:{port}/v1/queue").json()
+    log(
+        f"Admissão ({ADMISSION_IN_FLIGHT} vagas, fila {api.scheduler.max_queue}): {r['requests']} atendidos, "
+        f"{r['rejected']} recusados (429), TTFT médio {r['ttft_mean']:.2f}s, p95 {r['ttft_p95']:.2f}s"
+    )
+    log(f"/v1/queue: {stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /v1/chat com um LLM falso local")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=CONCURRENCY)
+    parser.add_argument("--per-client", type=int, default=REQUESTS_PER_CLIENT)
+    parser.add_argument("--tokens", type=int, default=STUB_TOKENS)
+    parser.add_argument("--token-delay", type=float, default=STUB_TOKEN_DELAY)
+    parser.add_argument("--legacy", action="store_true", help="Mede também o endpoint síncrono antigo")
+    parser.add_argument("--admission", action="store_true",
+                        help=f"Rajada de {ADMISSION_CLIENTS} clientes com {ADMISSION_IN_FLIGHT} gerações por vez")
+    args = parser.parse_args()
+
+    # Dados de verdade num diretório temporário; recuperação só BM25 (sem carregar o encoder)
+    workdir = Path(tempfile.mkdtemp(prefix="bench_api_"))
+    os.chdir(workdir)
+    (workdir / "data" / "reports").mkdir(parents=True)
+    generate_chat(workdir / "chat.txt", N_MESSAGES)
+    llm_port, api_port = free_port(), free_port()
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{llm_port}"
+    os.environ["RETRIEVAL_MODE"] = "lexical"
+    # O LLM falso não tem limite: aqui só interessa se a API escala
+    os.environ["LLM_MAX_IN_FLIGHT"] = str(max(args.concurrency))
+
+    from src.ingestion.processor import WhatsAppProcessor
+    WhatsAppProcessor().ingest_incremental(workdir / "chat.txt", "data/processed/chat_history.parquet")
+    from src.interface import api
+    add_legacy_route(api)
+
+    serve(stub_llm(args.tokens, args.token_delay), llm_port)
+    serve(api.app, api_port)
+
+    print(colored("🏁 TESTE DE CARGA DO /v1/chat", "white", attrs=["bold"]))
+    log(f"LLM falso: {args.tokens} tokens x {args.token_delay * 1000:.0f} ms; {args.per_client} respostas por cliente")
+    endpoints = [("async", "/v1/chat")] + ([("antigo", "/bench/legacy_chat")] if args.legacy else [])
+    print(f"{'endpoint':<10}{'clientes':>10}{'req/s':>10}{'escala':>10}{'TTFT(s)':>10}{'TTFT p95':>10}")
+
+    failed = False
+    for name, path in endpoints:
+        base = None
+        for concurrency in args.concurrency:
+            r = asyncio.run(load(f"http://127.0.0.1:{api_port}{path}", concurrency, args.per_client))
+            base = base or r['req_per_s'] / concurrency
+            scaling = r['req_per_s'] / base
+            print(f"{name:<10}{concurrency:>10}{r['req_per_s']:>10.2f}{scaling:>9.1f}x{r['ttft_mean']:>10.3f}{r['ttft_p95']:>10.3f}")
+            if name == "async" and scaling < MIN_SCALING * concurrency:
+                failed = True
+
+    if args.admission:
+        admission(api, api_port)
+
+    if failed:
+        log(f"Throughput não escalou com a concorrência (mínimo {MIN_SCALING:.0%} do ideal).", "FAIL")
+        return 1
+    log("Throughput escala com a concorrência: os streams não bloqueiam uns aos outros.", "PASS")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from termcolor import colored
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.embeddings.encoders import BACKENDS, CPUEncoderPool, default_workers, load_encoder
+from src.embeddings.vector_store import MODEL_NAME
+from tests.synthetic_chat import iter_lines
+
+# --- CONFIG ---
+N_TEXTS = 2_000
+N_QUERIES = 50
+BATCH_SIZE = 64
+# Cosseno médio mínimo contra o modelo torch para o backend passar
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+def log(msg, status="INFO"):
+    colors = {"INFO": "cyan", "PASS": "green", "FAIL": "red", "WARN": "yellow"}
+    prefix = {"INFO": "ℹ️", "PASS": "✅", "FAIL": "❌", "WARN": "⚠️"}
+    print(colored(f"{prefix[status]} {msg}", colors[status]))
+
+def sample_texts(n):
+    """Mensagens 'autor: conteúdo' do export sintético, no formato que vai para o encoder."""
+    texts = []
+    for line in iter_lines(n * 2):
+        if " - " in line and ": " in line:
+            texts.append(line.split(" - ", 1)[1])
+        if len(texts) == n:
+            break
+    return texts
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+def pool_throughput(encoder, texts, batch_size):
+    """msgs/s encodando `texts` em chamadas de `batch_size` mensagens."""
+    encoder.encode(texts[:batch_size], show_progress_bar=False)  # aquecimento
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        encoder.encode(texts[i:i + batch_size], show_progress_bar=False)
+    return len(texts) / (time.perf_counter() - t0)
+
+def bench_pool(texts, backend):
+    """Escala do CPUEncoderPool: lote fixo dividido entre os workers vs lote x workers."""
+    max_workers = default_workers()
+    counts = sorted({1, *(2 ** k for k in range(1, max_workers.bit_length())), max_workers})
+    print(f"{'workers':<10}{f'lote {BATCH_SIZE} (msgs/s)':>24}{'lote x workers (msgs/s)':>26}{'escala':>8}")
+    base = None
+    for workers in counts:
+        pool = CPUEncoderPool(MODEL_NAME, workers=workers, backend=backend)
+        try:
+            split = pool_throughput(pool, texts, BATCH_SIZE)
+            scaled = pool_throughput(pool, texts, BATCH_SIZE * workers)
+        finally:
+            pool.close()
+        base = base or scaled
+        print(f"{workers:<10}{split:>24,.0f}{scaled:>26,.0f}{scaled / base:>7.1f}x")
+    return 0
+
+def measure(encoder, texts, queries):
+    """Throughput em lote (msgs/s) e latência de uma pergunta isolada (p50/p95 em ms)."""
+    encoder.encode(texts[:BATCH_SIZE], show_progress_bar=False)  # aquecimento
+    t0 = time.perf_counter()
+    vectors = np.concatenate([
+        encoder.encode(texts[i:i + BATCH_SIZE], show_progress_bar=False)
+        for i in range(0, len(texts), BATCH_SIZE)
+    ])
+    throughput = len(texts) / (time.perf_counter() - t0)
+
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        encoder.encode([q], show_progress_bar=False)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return vectors, throughput, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade e latência dos backends de embedding")
+    parser.add_argument("--backends", nargs="+", default=[b for b in BACKENDS if b != "torch"],
+                        choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--texts", type=int, default=N_TEXTS)
+    parser.add_argument("--pool", choices=BACKENDS, help="mede a escala do CPUEncoderPool com este backend")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    if args.pool:
+        print(colored("🏁 ESCALA DO POOL DE CPU", "white", attrs=["bold"]))
+        log(f"{len(texts)} mensagens sintéticas, backend {args.pool}, modelo {MODEL_NAME}")
+        return bench_pool(texts, args.pool)
+    queries = ["quem falou de viagem para a praia?", "qual o preço combinado?", "quando foi a reunião do projeto?"]
+    queries = (queries * (N_QUERIES // len(queries) + 1))[:N_QUERIES]
+
+    print(colored("🏁 BENCHMARK DE ENCODERS", "white", attrs=["bold"]))
+    log(f"{len(texts)} mensagens sintéticas, lotes de {BATCH_SIZE}, modelo {MODEL_NAME}")
+
+    results = {}
+    for backend in ["torch"] + args.backends:
+        encoder = load_encoder(MODEL_NAME, backend, device="cpu")
+        results[backend] = measure(encoder, texts, queries)
+        del encoder
+
+    reference = results["torch"][0]
+    print(f"{'backend':<12}{'msgs/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'cos médio':>12}{'cos mín':>10}")
+    failures = []
+    for backend, (vectors, throughput, p50, p95) in results.items():
+        cos = cosine_rows(vectors, reference)
+        print(f"{backend:<12}{throughput:>10,.0f}{p50:>10.1f}{p95:>10.1f}{cos.mean():>12.5f}{cos.min():>10.5f}")
+        if backend in MIN_COSINE and cos.mean() < MIN_COSINE[backend]:
+            failures.append(f"{backend}: cosseno médio {cos.mean():.5f} < {MIN_COSINE[backend]}")
+
+    for f in failures:
+        log(f, "FAIL")
+    if not failures:
+        log("Todos os backends concordam com o modelo torch.", "PASS")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
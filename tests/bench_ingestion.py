@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from termcolor import colored
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tests.synthetic_chat import SIZES, FORMATS, generate_chat, iter_lines
+
+# --- CONFIG ---
+BASELINE_PATH = Path(__file__).parent / "bench_ingestion_baseline.json"
+CACHE_DIR = Path(tempfile.gettempdir()) / "whatsapp_bench"
+MODES = ["memory", "stream", "parallel"]
+DEFAULT_SIZES = ["10k", "100k", "1M"]
+# Tolerância antes de acusar regressão (20% mais lento ou 20% mais memória)
+TOLERANCE = 0.20
+# Conferência paralelo == serial: linhas do export e tamanho mínimo de cada pedaço
+VERIFY_LINES = 20_000
+VERIFY_CHUNK_BYTES = 32 * 1024
+
+def log(msg, status="INFO"):
+    colors = {"INFO": "cyan", "PASS": "green", "FAIL": "red", "WARN": "yellow"}
+    prefix = {"INFO": "ℹ️", "PASS": "✅", "FAIL": "❌", "WARN": "⚠️"}
+    print(colored(f"{prefix[status]} {msg}", colors[status]))
+
+def peak_rss_mb():
+    # ru_maxrss é KB no Linux e bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_child(chat_path, mode):
+    """Executa uma ingestão isolada (processo filho) e mede tempos e RSS."""
+    from src.ingestion.processor import WhatsAppProcessor
+
+    proc = WhatsAppProcessor()
+    out_dir = tempfile.mkdtemp(prefix="bench_out_")
+    output = os.path.join(out_dir, "chat_history.parquet")
+
+    start = time.perf_counter()
+    if mode == "stream":
+        # No streaming, parse e escrita se intercalam: mede o tempo gasto
+        # produzindo os lotes e atribui o resto à escrita do Parquet
+        produce = [0.0]
+        def timed(batches):
+            it = iter(batches)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    batch = next(it)
+                except StopIteration:
+                    produce[0] += time.perf_counter() - t0
+                    return
+                produce[0] += time.perf_counter() - t0
+                yield batch
+        rows = proc.save_processed(timed(proc.iter_batches(chat_path)), output)
+        total = time.perf_counter() - start
+        parse_s, write_s = produce[0], total - produce[0]
+    else:
+        df = proc.parse_file_parallel(chat_path) if mode == "parallel" else proc.parse_file(chat_path)
+        parse_s = time.perf_counter() - start
+        t0 = time.perf_counter()
+        rows = proc.save_processed(df, output)
+        write_s = time.perf_counter() - t0
+
+    return {
+        "lines": proc.lines_read,
+        "rows": rows,
+        "parse_s": round(parse_s, 3),
+        "write_s": round(write_s, 3),
+        "lines_per_sec": round(proc.lines_read / parse_s) if parse_s else 0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def bench(size, fmt, mode):
+    n = SIZES[size]
+    chat_path = CACHE_DIR / f"{fmt}_{size}.txt"
+    if not chat_path.exists():
+        log(f"Gerando export sintético {fmt}/{size} ({n} linhas)...")
+        generate_chat(chat_path, n, fmt)
+
+    # Processo novo por medição: o pico de RSS não se mistura entre tamanhos
+    res = subprocess.run(
+        [sys.executable, __file__, "--child", str(chat_path), mode],
+        capture_output=True, text=True,
+    )
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip().splitlines()[-1] if res.stderr else "falha no processo filho")
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+def verify_parallel(fmt):
+    """Confere que `parse_file_parallel` devolve exatamente o mesmo que `parse_file`.
+
+    O export tem uma linha de continuação a cada poucas mensagens (os cortes
+    entre pedaços caem perto de mensagens multi-linha) e duas linhas em
+    latin-1 em pedaços diferentes, para exercitar a troca de encoding no meio
+    de um pedaço. Pedaços pequenos forçam dezenas de cortes.
+    """
+    from src.ingestion import processor
+    from src.ingestion.processor import WhatsAppProcessor
+
+    path = CACHE_DIR / f"verify_{fmt}.txt"
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    lines = list(iter_lines(VERIFY_LINES, fmt))
+    latin1_at = {len(lines) // 3, 2 * len(lines) // 3}
+    with open(path, "wb") as f:
+        for i, line in enumerate(lines):
+            f.write(line.encode("utf-8") + b"\n")
+            if i in latin1_at:
+                f.write(f"observação {i} gravada em latin-1\n".encode("latin-1"))
+            elif i % 7 == 0:
+                f.write(f"continuação {i} da mensagem ação\n".encode("utf-8"))
+
+    min_chunk, processor.MIN_CHUNK_BYTES = processor.MIN_CHUNK_BYTES, VERIFY_CHUNK_BYTES
+    try:
+        serial, parallel = WhatsAppProcessor(), WhatsAppProcessor()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                expected = serial.parse_file(path)
+                got = parallel.parse_file_parallel(path, workers=32)
+            finally:
+                sys.stdout = stdout
+    finally:
+        processor.MIN_CHUNK_BYTES = min_chunk
+
+    problems = []
+    if not got.equals(expected):
+        diff = (got.astype(str) != expected.astype(str)).any(axis=1) if got.shape == expected.shape else None
+        where = f"primeira linha diferente: {diff.idxmax()}" if diff is not None and diff.any() else f"{len(got)} != {len(expected)} linhas"
+        problems.append(f"DataFrames diferentes ({where})")
+    for attr in ("encoding", "lines_read", "matches_found", "media", "media_count", "offset"):
+        if getattr(parallel, attr) != getattr(serial, attr):
+            problems.append(f"{attr}: {getattr(parallel, attr)!r} != {getattr(serial, attr)!r}")
+    return problems
+
+def check_regression(key, result, baseline):
+    ref = baseline.get(key)
+    if not ref:
+        return []
+    problems = []
+    if result["lines_per_sec"] < ref["lines_per_sec"] * (1 - TOLERANCE):
+        problems.append(f"lines/s {result['lines_per_sec']} < baseline {ref['lines_per_sec']}")
+    if result["peak_rss_mb"] > ref["peak_rss_mb"] * (1 + TOLERANCE):
+        problems.append(f"RSS {result['peak_rss_mb']}MB > baseline {ref['peak_rss_mb']}MB")
+    if result["write_s"] > ref["write_s"] * (1 + TOLERANCE) and result["write_s"] - ref["write_s"] > 0.5:
+        problems.append(f"escrita {result['write_s']}s > baseline {ref['write_s']}s")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput da ingestão")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, choices=list(SIZES))
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como novo baseline")
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if not baseline and not args.save_baseline:
+        log(f"Sem baseline em {BASELINE_PATH.name}: rode com --save-baseline para criar.", "WARN")
+
+    print(colored("🏁 BENCHMARK DE INGESTÃO", "white", attrs=["bold"]))
+    print(f"{'caso':<24}{'linhas':>12}{'linhas/s':>12}{'parse(s)':>10}{'write(s)':>10}{'RSS(MB)':>10}")
+
+    results, failures = {}, []
+    if "parallel" in args.modes:
+        for fmt in args.formats:
+            problems = verify_parallel(fmt)
+            for problem in problems:
+                failures.append(f"{fmt}/parallel != serial: {problem}")
+            if not problems:
+                log(f"{fmt}: ingestão paralela idêntica à serial.", "PASS")
+
+    for size in args.sizes:
+        for fmt in args.formats:
+            for mode in args.modes:
+                key = f"{fmt}/{mode}/{size}"
+                r = bench(size, fmt, mode)
+                results[key] = r
+                print(f"{key:<24}{r['lines']:>12,}{r['lines_per_sec']:>12,}{r['parse_s']:>10}{r['write_s']:>10}{r['peak_rss_mb']:>10}")
+                for problem in check_regression(key, r, baseline):
+                    failures.append(f"{key}: {problem}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        log(f"Baseline salvo em {BASELINE_PATH}", "PASS")
+        return 0
+
+    if failures:
+        for f in failures:
+            log(f, "FAIL")
+        return 1
+    log("Nenhuma regressão em relação ao baseline.", "PASS")
+    return 0
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        # Silencia os prints da ingestão; só o JSON final vai para o stdout
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            result = run_child(sys.argv[2], sys.argv[3])
+            sys.stdout = stdout
+        print(json.dumps(result))
+        sys.exit(0)
+    sys.exit(main())
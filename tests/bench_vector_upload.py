@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from termcolor import colored
+
+# Adiciona raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from src.embeddings import stores
+from src.embeddings.vector_store import BATCH_SIZE, message_payload, point_ids
+from src.ingestion.processor import WhatsAppProcessor
+from tests.synthetic_chat import SIZES, generate_chat
+
+# --- CONFIG ---
+CACHE_DIR = Path(tempfile.gettempdir()) / "whatsapp_bench"
+DIM = 384
+SEED = 42
+
+def log(msg, status="INFO"):
+    colors = {"INFO": "cyan", "PASS": "green", "FAIL": "red", "WARN": "yellow"}
+    prefix = {"INFO": "ℹ️", "PASS": "✅", "FAIL": "❌", "WARN": "⚠️"}
+    print(colored(f"{prefix[status]} {msg}", colors[status]))
+
+def load_df(size):
+    chat_path = CACHE_DIR / f"android_{size}.txt"
+    if not chat_path.exists():
+        log(f"Gerando export sintético {size}...")
+        generate_chat(chat_path, SIZES[size])
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        df = WhatsAppProcessor().parse_file(chat_path)
+        sys.stdout = stdout
+    return df
+
+def legacy_prepare(df, ids, vectors):
+    """Caminho antigo: um dict por mensagem, `emb.tolist()` e um PointStruct por ponto."""
+    payload = df[['date', 'time', 'author', 'content']].astype({'author': str})
+    timestamp = df['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    payload['timestamp'] = timestamp.astype(object).where(timestamp.notna(), None)
+    metadata = payload.to_dict('records')
+    batches = []
+    for i in range(0, len(ids), BATCH_SIZE):
+        batches.append([
+            models.PointStruct(id=point_id, vector=emb.tolist(), payload=meta)
+            for point_id, emb, meta in zip(ids[i:i + BATCH_SIZE], vectors[i:i + BATCH_SIZE], metadata[i:i + BATCH_SIZE])
+        ])
+    return batches
+
+def columnar_prepare(df, ids, vectors):
+    """Caminho novo: tabela Arrow de payloads fatiada por lote, vetores como matriz."""
+    payload = message_payload(df)
+    return [
+        (ids[i:i + BATCH_SIZE], vectors[i:i + BATCH_SIZE], payload.slice(i, BATCH_SIZE))
+        for i in range(0, len(ids), BATCH_SIZE)
+    ]
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def bench_qdrant(df, ids, vectors):
+    """Preparo + upload no Qdrant local: PointStructs + upload_points vs caminho colunar + upload_collection.
+
+    Os dois lados são medidos de ponta a ponta: no caminho colunar os dicts
+    de payload e os pontos ainda são montados, só que dentro do
+    `QdrantStore._flush`/`upload_collection`.
+    """
+    results = {}
+    for name in ("antes", "depois"):
+        client = QdrantClient(path=tempfile.mkdtemp(prefix="bench_qdrant_"))
+        client.create_collection("bench", vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+        t0 = time.perf_counter()
+        if name == "antes":
+            for batch in legacy_prepare(df, ids, vectors):
+                client.upload_points(collection_name="bench", points=batch)
+        else:
+            store = stores.QdrantStore("bench", client=client)
+            for batch in columnar_prepare(df, ids, vectors):
+                store.upload(*batch)
+            store.commit()
+        results[name] = time.perf_counter() - t0
+        client.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead por mensagem no upload de vetores (fora o encoder)")
+    parser.add_argument("--size", default="100k", choices=list(SIZES))
+    parser.add_argument("--qdrant", action="store_true", help="Mede preparo + upload no Qdrant local (lento; é a comparação antes/depois)")
+    args = parser.parse_args()
+
+    df = load_df(args.size)
+    n = len(df)
+    ids = point_ids(df)
+    vectors = np.random.default_rng(SEED).standard_normal((n, DIM), dtype=np.float32)
+
+    print(colored("🏁 BENCHMARK DE UPLOAD DE VETORES", "white", attrs=["bold"]))
+    log(f"{n:,} mensagens, vetores {DIM}d, lotes de {BATCH_SIZE}")
+
+    # Só informativo: o preparo colunar cria fatias preguiçosas e adia os
+    # dicts/pontos para o upload, então não dá para comparar os dois sozinhos
+    _, t_legacy = timed(legacy_prepare, df, ids, vectors)
+    _, t_columnar = timed(columnar_prepare, df, ids, vectors)
+
+    # Fim a fim no índice numpy (só o caminho colunar existe nele)
+    store = stores.NumpyStore("bench", base_dir=tempfile.mkdtemp(prefix="bench_numpy_"))
+    store.create(DIM)
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        for batch in columnar_prepare(df, ids, vectors):
+            store.upload(*batch)
+        store.commit()
+        sys.stdout = stdout
+    t_numpy = time.perf_counter() - t0
+
+    us = lambda seconds: seconds / n * 1e6
+    print(f"{'etapa':<44}{'total(s)':>10}{'µs/msg':>10}")
+    print(f"{'só preparo antes (dicts + PointStruct)':<44}{t_legacy:>10.2f}{us(t_legacy):>10.1f}")
+    print(f"{'só preparo depois (fatias Arrow, adiado)':<44}{t_columnar:>10.2f}{us(t_columnar):>10.1f}")
+    print(f"{'índice numpy (preparo + upload + commit)':<44}{t_numpy:>10.2f}{us(t_numpy):>10.1f}")
+    if not args.qdrant:
+        log("Sem --qdrant não há comparação antes/depois de ponta a ponta.", "WARN")
+        return 0
+    q = bench_qdrant(df, ids, vectors)
+    print(f"{'qdrant local antes (preparo + upload_points)':<44}{q['antes']:>10.2f}{us(q['antes']):>10.1f}")
+    print(f"{'qdrant local depois (preparo + upload_collection)':<44}{q['depois']:>10.2f}{us(q['depois']):>10.1f}")
+    log(f"Preparo + upload no Qdrant {q['antes'] / q['depois']:.1f}x mais rápido no caminho colunar.", "PASS")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# --- CONFIG ---
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+FORMATS = ["android", "ios"]
+SEED = 42
+
+AUTHORS = [
+    "Ana", "Bruno", "Carla Souza", "Diego", "Eduarda", "Fábio 🚀", "Gabi",
+    "+55 11 91234-5678", "Henrique (Trabalho)", "Íris", "João/Pedro", "Karina",
+]
+WORDS = (
+    "oi bom dia galera kkkk sim não talvez amanhã hoje reunião viagem praia "
+    "projeto código deploy cerveja futebol jogo ontem preço r$ 50 link https://exemplo.com "
+    "vamos combinar onde quando quem porque ok blz valeu top demais ação coração"
+).split()
+SYSTEM_EVENTS = ["entrou usando o link de convite", "saiu", "mudou o nome do grupo", "foi adicionado(a)"]
+
+# Probabilidades por mensagem
+P_SYSTEM = 0.02
+P_MEDIA = 0.05
+P_ATTACHMENT = 0.02
+P_MULTILINE = 0.05
+
+def _header(fmt, ts):
+    if fmt == "ios":
+        return f"[{ts.day:02d}/{ts.month:02d}/{ts:%y}, {ts:%H:%M:%S}]"
+    return f"{ts.month}/{ts.day}/{ts:%y}, {ts:%H:%M} -"
+
+def _sentence(rng, min_words=1, max_words=25):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def iter_lines(n_lines, fmt="android", seed=SEED):
+    """Gera exatamente `n_lines` linhas de um export sintético (determinístico)."""
+    rng = random.Random(seed)
+    ts = datetime(2022, 1, 1, 8, 0, 0)
+    produced = 0
+    while produced < n_lines:
+        ts += timedelta(seconds=rng.randint(1, 900))
+        head = _header(fmt, ts)
+        author = rng.choice(AUTHORS)
+        r = rng.random()
+
+        if r < P_SYSTEM:
+            lines = [f"{head} {author} {rng.choice(SYSTEM_EVENTS)}"]
+        elif r < P_SYSTEM + P_MEDIA:
+            placeholder = "\u200eimage omitted" if fmt == "ios" else "<Mídia omitida>"
+            lines = [f"{head} {author}: {placeholder}"]
+        elif r < P_SYSTEM + P_MEDIA + P_ATTACHMENT:
+            if fmt == "ios":
+                name = f"{produced:08d}-PHOTO-{ts:%Y-%m-%d-%H-%M-%S}.jpg"
+                lines = [f"\u200e{head} {author}: \u200e<attached: {name}>"]
+            else:
+                name = f"IMG-{ts:%Y%m%d}-WA{produced % 10000:04d}.jpg"
+                lines = [f"{head} {author}: {name} (arquivo anexado)"]
+        else:
+            lines = [f"{head} {author}: {_sentence(rng)}"]
+            if rng.random() < P_MULTILINE:
+                lines += [_sentence(rng, 0, 12) for _ in range(rng.randint(1, 3))]
+
+        for line in lines[:n_lines - produced]:
+            yield line
+            produced += 1
+
+def generate_chat(path, n_lines, fmt="android", seed=SEED):
+    """Escreve o export sintético em `path` e devolve o caminho."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for line in iter_lines(n_lines, fmt, seed):
+            f.write(line + "\n")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera exports sintéticos de WhatsApp")
+    parser.add_argument("output")
+    parser.add_argument("--size", default="10k", help=f"Um de {list(SIZES)} ou número de linhas")
+    parser.add_argument("--format", default="android", choices=FORMATS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    n = SIZES.get(args.size) or int(args.size)
+    print(f"📝 Gerando {n} linhas ({args.format}) em {generate_chat(args.output, n, args.format, args.seed)}")